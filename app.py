@@ -1,39 +1,55 @@
 # app.py
 import os
 import json
-import time
-from flask import Flask, request, render_template, Response
-from hashing import compute_hashes
-from vt import check_url_virustotal, check_filehash_virustotal
+from flask import Flask, request, render_template, Response, stream_template, url_for, jsonify
+from vt import check_filehash_virustotal, normalize_file_report
 from logger import log_event
 from notifier import notify
 
-from history_db import list_all, get_cached_result
 from flask import send_file
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-import io
-import json
+from datetime import datetime, timedelta
 
 # DB modules
 import local_db
 import history_db
+import file_cache
+import log_store
+import url_jobs
+import event_store
+import quarantine_store
+import verdict
+import reports
+import batch_scan
+from watcher_service import read_status as watcher_status
+from upload_stream import HashingRequest
+from config import UPLOAD_FOLDER, UPLOAD_MAX_BYTES
 
 # initialize DBs
 local_db.init_db()
 history_db.init_db()
+history_db.start_purge_thread()
+file_cache.init_db()
+log_store.init_index()
+quarantine_store.init_db()
+quarantine_store.start_evict_thread()
 
 app = Flask(__name__)
-UPLOAD_FOLDER = "uploads"
+# uploads are hashed as they stream in (see upload_stream.py)
+app.request_class = HashingRequest
+app.config["MAX_CONTENT_LENGTH"] = UPLOAD_MAX_BYTES
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 SETTINGS_FILE = "settings.json"
+SSE_KEEPALIVE = 15      # seconds between keepalive comments on an idle event stream
 
 def load_settings():
     if not os.path.exists(SETTINGS_FILE):
         return {
             "vt_api_key": "",
+            "vt_rate_per_min": "4",
             "watchdog_folders": "",
+            "watch_recursive": "no",
+            "baseline_scan": "yes",
             "discord_webhook": "",
             "email_to": "",
             "scanning_enabled": "yes"
@@ -47,29 +63,22 @@ def save_settings(data):
 def home():
     return render_template("index.html")
 
+@app.errorhandler(413)
+def upload_too_large(e):
+    return render_template("too_large.html", limit_mb=UPLOAD_MAX_BYTES // (1024 * 1024)), 413
+
 @app.route("/settings")
 def settings_page():
     settings = load_settings()
     return render_template("settings.html", settings=settings)
 @app.route("/history")
 def view_history():
-    rows = history_db.list_all(limit=200)
+    return render_template("history.html", items=history_db.list_summaries(limit=200))
 
-    # rows = [(key, key_type, result_json, last_scanned), ...]
-    parsed = []
-    for key, key_type, result_json, last_scanned in rows:
-        try:
-            result_obj = json.loads(result_json)
-        except Exception:
-            result_obj = {}
-        parsed.append({
-            "key": key,
-            "type": key_type,
-            "result": result_obj,
-            "date": last_scanned
-        })
-
-    return render_template("history.html", items=parsed)
+@app.route("/api/cache/stats")
+def cache_stats():
+    return jsonify(dict(history_db.cache_stats(), file_hashes=file_cache.stats(),
+                        quarantine=quarantine_store.stats()))
 
 @app.route("/download_pdf/<key>")
 def download_pdf(key):
@@ -78,81 +87,97 @@ def download_pdf(key):
     if not entry:
         return "No such record."
 
-    result = entry["result"]
-    date = entry["last_scanned"]
-
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-
-    p.setFont("Helvetica-Bold", 16)
-    p.drawString(50, 750, "Cyber Security Analyzer - Scan Report")
-
-    p.setFont("Helvetica", 12)
-    p.drawString(50, 720, f"Key: {key}")
-    p.drawString(50, 700, f"Scanned: {date}")
-
-    p.drawString(50, 670, "Summary:")
-    y = 650
-
-    counts = result.get("counts", {})
-    for k, v in counts.items():
-        p.drawString(70, y, f"{k.capitalize()}: {v}")
-        y -= 20
-
-    p.drawString(50, y - 10, "Engine Results:")
-    y -= 40
-
-    engines = result.get("engines", {})
-    for eng, data in engines.items():
-        if y < 50:  # new page if space too small
-            p.showPage()
-            y = 750
-        p.drawString(70, y, f"{eng}: {data.get('result', 'unknown')}")
-        y -= 20
-
-    p.showPage()
-    p.save()
-
-    buffer.seek(0)
     return send_file(
-        buffer,
+        reports.get_pdf(key, entry),
         as_attachment=True,
-        download_name=f"scan_report_{key}.pdf",
+        download_name=reports.report_name(key),
         mimetype="application/pdf"
     )
 
+@app.route("/export_reports")
+def export_reports():
+    """ZIP of reports: the selected keys, or everything scanned between
+    ?from= and ?to= (dates, inclusive)."""
+    keys = request.args.getlist("key")
+    if keys:
+        entries = history_db.iter_entries(keys=keys, limit=reports.EXPORT_MAX)
+    else:
+        try:
+            start = request.args.get("from") or None
+            end = request.args.get("to") or None
+            if start:
+                start = datetime.fromisoformat(start).isoformat()
+            if end:
+                end = (datetime.fromisoformat(end) + timedelta(days=1)).isoformat()
+        except ValueError:
+            return "Dates must be YYYY-MM-DD.", 400
+        entries = history_db.iter_entries(start=start, end=end, limit=reports.EXPORT_MAX)
+
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return Response(reports.export_zip(entries), mimetype="application/zip",
+                    headers={"Content-Disposition": f"attachment; filename=scan_reports_{stamp}.zip"})
+
 @app.route("/save_settings", methods=["POST"])
 def save_settings_route():
-    data = {
+    # keep keys that are not on the form (e.g. hash_algorithms, scan_workers)
+    data = load_settings()
+    data.update({
         "vt_api_key": request.form.get("vt_api_key"),
+        "vt_rate_per_min": request.form.get("vt_rate_per_min", "4"),
         "watchdog_folders": request.form.get("watchdog_folders"),
+        "watch_recursive": request.form.get("watch_recursive", "no"),
+        "baseline_scan": request.form.get("baseline_scan", "yes"),
+        "enable_discord": request.form.get("enable_discord", "no"),
         "discord_webhook": request.form.get("discord_webhook"),
+        "enable_telegram": request.form.get("enable_telegram", "no"),
+        "telegram_bot": request.form.get("telegram_bot", ""),
+        "telegram_chat_id": request.form.get("telegram_chat_id", ""),
+        "enable_email": request.form.get("enable_email", "no"),
         "email_to": request.form.get("email_to"),
+        "smtp_server": request.form.get("smtp_server", ""),
+        "smtp_port": request.form.get("smtp_port", "587"),
+        "smtp_username": request.form.get("smtp_username", ""),
+        "smtp_password": request.form.get("smtp_password", ""),
+        "smtp_starttls": request.form.get("smtp_starttls", "yes"),
         "scanning_enabled": request.form.get("scanning_enabled", "yes")
-    }
+    })
     save_settings(data)
     return render_template("settings_saved.html")
 
 @app.route("/watch_log")
 def watch_log():
-    return render_template("watch_log.html")
+    return render_template("watch_log.html", status=watcher_status())
+
+@app.route("/api/watcher/status")
+def api_watcher_status():
+    return jsonify(watcher_status())
 
 @app.route("/stream_events")
 def stream_events():
-    def event_stream():
-        last_len = 0
+    # resume after the last event the browser saw; ids are persistent rows
+    # in events.db, so an id newer than the store only happens when
+    # events.db was recreated, and means "start over"
+    try:
+        last_id = int(request.headers.get("Last-Event-ID", 0))
+    except ValueError:
+        last_id = 0
+    if last_id > event_store.latest_id():
+        last_id = 0
+
+    def event_stream(last_id):
+        yield "retry: 3000\n\n"
         while True:
-            events = []  # If you have get_events
-            try:
-                from event_store import get_events
-                events = get_events()
-            except Exception:
-                events = []
-            if len(events) != last_len:
-                last_len = len(events)
-                yield f"data: {json.dumps(events)}\n\n"
-            time.sleep(1)
-    return Response(event_stream(), mimetype="text/event-stream")
+            events = event_store.wait_for_events(last_id, timeout=SSE_KEEPALIVE)
+            if not events:
+                # comment line keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+                continue
+            for event in events:
+                yield f"id: {event['id']}\ndata: {json.dumps(event)}\n\n"
+            last_id = events[-1]["id"]
+
+    return Response(event_stream(last_id), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # ---------------- URL SCAN ----------------
 @app.route("/check_url", methods=["POST"])
@@ -169,37 +194,67 @@ def check_url():
     cached = history_db.get_cached_result(url, "url")
     if cached:
         cached_obj = cached["result"]
-        # cached_obj expected to be normalized dict { "counts": {...}, "engines": {...} }
-        counts = cached_obj.get("counts", {})
-        engines = cached_obj.get("engines", {})
+        # cached_obj expected to be normalized dict { "counts": {...}, "engines": {...}, "verdict": {...} }
         # log and notify (optional)
         log_event(event_type="manual_url_scan", url=url, vt_result=cached_obj)
         notify(event_type="manual_url_scan", url=url, vt_result=cached_obj)
-        return render_template("result.html", vt_result=engines, counts=counts, hashes=None)
-
-    # Not cached -> query VT
-    engines = check_url_virustotal(url)
-    # normalize counts
-    counts = {"malicious":0,"suspicious":0,"clean":0,"harmless":0}
-    for eng, info in engines.items():
-        cat = info.get("result") or info.get("category") or "clean"
-        if cat == "malicious":
-            counts["malicious"] += 1
-        elif cat == "suspicious":
-            counts["suspicious"] += 1
-        elif cat == "harmless":
-            counts["harmless"] += 1
-        else:
-            counts["clean"] += 1
-
-    normalized = {"counts": counts, "engines": engines}
-    # cache it
-    history_db.add_or_update_cache(url, "url", normalized)
-
-    log_event(event_type="manual_url_scan", url=url, vt_result=normalized)
-    notify(event_type="manual_url_scan", url=url, vt_result=normalized)
-
-    return render_template("result.html", vt_result=engines, counts=counts, hashes=None)
+        return render_template("result.html", vt_result=cached_obj.get("engines", {}),
+                               verdict=verdict.of(cached_obj), hashes=None)
+
+    # Not cached -> scan in the background, the page polls /job/<id>
+    job_id = url_jobs.submit(url)
+    return render_template("scan_pending.html", job_id=job_id, url=url)
+
+@app.route("/job/<job_id>")
+def job_status(job_id):
+    job = url_jobs.get_job(job_id)
+    if not job:
+        return jsonify({"error": "unknown job"}), 404
+    return jsonify(job)
+
+@app.route("/job/<job_id>/result")
+def job_result(job_id):
+    job = url_jobs.get_job(job_id)
+    if not job:
+        return "No such job."
+    status, result = url_jobs.get_result(job_id)
+    if result is None:
+        return render_template("scan_pending.html", job_id=job_id, url=job["url"])
+    # a failed job has an empty result; don't let it read as clean
+    return render_template("result.html", vt_result=result["engines"], verdict=verdict.of(result),
+                           hashes=None, failed=status != "completed")
+
+# ---------------- BATCH API ----------------
+@app.route("/api/scan/batch", methods=["POST"])
+def api_scan_batch():
+    """{"hashes": [...], "urls": [...], "wait": seconds, "engines": bool} ->
+    NDJSON, one line per IOC as its verdict becomes available."""
+    if load_settings().get("scanning_enabled") == "no":
+        return jsonify({"error": "scanning is disabled"}), 503
+
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "expected a JSON object with \"hashes\" and/or \"urls\""}), 400
+    try:
+        raw_hashes, raw_urls = batch_scan.items(body)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if len(raw_hashes) + len(raw_urls) > batch_scan.MAX_ITEMS:
+        return jsonify({"error": f"at most {batch_scan.MAX_ITEMS} IOCs per request"}), 413
+    hashes, urls, errors = batch_scan.parse(raw_hashes, raw_urls)
+    try:
+        wait = float(body.get("wait", batch_scan.DEFAULT_WAIT))
+    except (TypeError, ValueError):
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+
+    def stream():
+        for line in errors:
+            yield json.dumps(line) + "\n"
+        for line in batch_scan.scan(hashes, urls, timeout=wait, engines=bool(body.get("engines"))):
+            yield json.dumps(line) + "\n"
+
+    return Response(stream(), mimetype="application/x-ndjson",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # ---------------- FILE SCAN ----------------
 @app.route("/upload_file", methods=["POST"])
@@ -212,99 +267,85 @@ def upload_file():
     if not file or file.filename.strip() == "":
         return render_template("empty_input.html")
 
-    path = os.path.join(UPLOAD_FOLDER, file.filename)
-    file.save(path)
-
-    # compute hashes
-    hashes = compute_hashes(path)
+    # hashed while the body was received; nothing is on disk yet
+    hashes = file.stream.hexdigests()
     sha256 = hashes.get("sha256")
+    path = file.filename
 
     # 1) Local signature check
     if local_db.is_malicious_local(sha256):
-        counts = {"malicious":1,"suspicious":0,"clean":0,"harmless":0}
-        engines = {"LocalDB": {"result": "malicious", "engine_name": "Local Signature DB"}}
-        log_event(event_type="manual_file_scan", file_path=path, hashes=hashes, vt_result={"counts":counts,"engines":engines})
-        notify(event_type="manual_file_scan", file_path=path, hashes=hashes, vt_result={"counts":counts,"engines":engines})
-        return render_template("file_result.html", vt_result=engines, counts=counts, hashes=hashes)
+        local_result = local_db.local_verdict()
+        log_event(event_type="manual_file_scan", file_path=path, hashes=hashes, vt_result=local_result)
+        notify(event_type="manual_file_scan", file_path=path, hashes=hashes, vt_result=local_result)
+        return render_template("file_results.html", vt_result=local_result["engines"],
+                               verdict=verdict.of(local_result), hashes=hashes)
 
     # 2) History/cache check
     cached = history_db.get_cached_result(sha256, "sha256")
     if cached:
         cached_obj = cached["result"]
-        counts = cached_obj.get("counts", {})
-        engines = cached_obj.get("engines", {})
         log_event(event_type="manual_file_scan", file_path=path, hashes=hashes, vt_result=cached_obj)
         notify(event_type="manual_file_scan", file_path=path, hashes=hashes, vt_result=cached_obj)
-        return render_template("file_results.html", vt_result=engines, counts=counts, hashes=hashes)
+        return render_template("file_results.html", vt_result=cached_obj.get("engines", {}),
+                               verdict=verdict.of(cached_obj), hashes=hashes)
+
+    # unknown file: keep a copy, stored once per sha256
+    path, written = quarantine_store.put(file.stream, hashes, file.filename)
+    if not written:
+        print(f"[Upload] {file.filename} already stored as {path}")
 
     # 3) Not found locally -> query VT
     raw = check_filehash_virustotal(sha256)
-    if not raw:
-        # VT failed or no API key -> show partial info
-        counts = {"malicious":0,"suspicious":0,"clean":0,"harmless":0}
-        engines = {}
-        # Optionally cache empty result
-        history_db.add_or_update_cache(sha256, "sha256", {"counts":counts,"engines":engines})
+    if raw is None:
+        # VT failed or no API key -> show partial info, cache nothing
+        empty = normalize_file_report({})
         log_event(event_type="manual_file_scan", file_path=path, hashes=hashes, vt_result={})
         notify(event_type="manual_file_scan", file_path=path, hashes=hashes, vt_result={})
-        return render_template("file_results.html", vt_result=engines, counts=counts, hashes=hashes)
+        return render_template("file_results.html", vt_result={}, verdict=verdict.of(empty), hashes=hashes)
 
-    stats = raw.get("data", {}).get("attributes", {}).get("last_analysis_stats", {})
-    results = raw.get("data", {}).get("attributes", {}).get("last_analysis_results", {})
+    normalized = normalize_file_report(raw)
+    summary = verdict.of(normalized)
 
-    counts = {
-        "malicious": stats.get("malicious", 0),
-        "suspicious": stats.get("suspicious", 0),
-        "clean": stats.get("undetected", 0),
-        "harmless": stats.get("harmless", 0)
-    }
-
-    engines = {
-        eng: {
-            "result": details.get("category") or details.get("result") or "clean",
-            "engine_name": details.get("engine_name", eng)
-        }
-        for eng, details in (results or {}).items()
-    }
-
-    normalized = {"counts": counts, "engines": engines}
     # cache result
     history_db.add_or_update_cache(sha256, "sha256", normalized)
+    reports.schedule(sha256, "sha256")
 
     # enrichment: add to local DB if VT consensus strong
-    if counts.get("malicious", 0) >= 3:
+    if summary.malicious >= 3:
         local_db.add_malicious_hash(sha256)
 
-    log_event(event_type="manual_file_scan", file_path=path, hashes=hashes, vt_result=raw)
-    notify(event_type="manual_file_scan", file_path=path, hashes=hashes, vt_result=raw)
+    log_event(event_type="manual_file_scan", file_path=path, hashes=hashes, vt_result=normalized)
+    notify(event_type="manual_file_scan", file_path=path, hashes=hashes, vt_result=normalized)
 
-    return render_template("file_results.html", vt_result=engines, counts=counts, hashes=hashes)
+    return render_template("file_results.html", vt_result=normalized["engines"], verdict=summary, hashes=hashes)
 
 @app.route("/logs")
 def logs_page():
-    # adapt as before
-    from bakup.log_config import LOG_MODE, JSON_LOG_FILE, SQLITE_DB_FILE
-    import sqlite3
-
-    logs = []
-    if LOG_MODE == "json":
-        if os.path.exists(JSON_LOG_FILE):
-            logs = json.load(open(JSON_LOG_FILE))
-    else:
-        conn = sqlite3.connect(SQLITE_DB_FILE)
-        cursor = conn.cursor()
-        rows = cursor.execute("SELECT * FROM logs ORDER BY id DESC").fetchall()
-        conn.close()
-        for row in rows:
-            logs.append({
-                "timestamp": row[1],
-                "event_type": row[2],
-                "file_path": row[3],
-                "url": row[4],
-                "hashes": row[5],
-                "vt_result": row[6]
-            })
-    return render_template("logs.html", logs=logs)
+    filters = {
+        "event_type": request.args.get("event_type", "").strip() or None,
+        "since": request.args.get("since", "").strip() or None,
+        "until": request.args.get("until", "").strip() or None,
+        "sha256": request.args.get("sha256", "").strip() or None,
+    }
+    before = request.args.get("before", type=int)
+    limit = request.args.get("limit", log_store.DEFAULT_PAGE_SIZE, type=int)
+
+    logs, next_before = log_store.query_logs(before=before, limit=limit, **filters)
+
+    older_url = None
+    if next_before is not None:
+        active = {k: v for k, v in filters.items() if v}
+        older_url = url_for("logs_page", before=next_before, limit=limit, **active)
+
+    # rows are read from disk while the page is being sent
+    return Response(stream_template(
+        "logs.html",
+        logs=logs,
+        older_url=older_url,
+        limit=limit,
+        filters=filters,
+        event_types=log_store.event_types(),
+    ))
 
 if __name__ == "__main__":
     app.run(debug=True)
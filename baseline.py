@@ -0,0 +1,163 @@
+# baseline.py
+# Startup inventory of files that were already in the watch folders (the
+# watchers only see new files). The tree is walked with os.scandir and
+# every file goes through a scan pipeline: hashing runs in parallel on the
+# shared hash pool and verdicts are batched by the lookup coalescer.
+#
+# Files that are unchanged since they were last hashed (file_cache) and
+# whose verdict is already in history_db as clean are skipped without
+# reading them; everything else is scanned like a new file.
+#
+#   python baseline.py [folder ...] [--recursive]
+import argparse
+import os
+import threading
+import time
+
+import file_cache
+import history_db
+import local_db
+import verdict
+from config import WATCH_RECURSIVE, BASELINE_WORKERS, BASELINE_PROGRESS_INTERVAL, READY_IGNORE_SUFFIXES
+from scan_pipeline import ScanPipeline, hash_file, process_file, shutdown_hash_pool, wait_for_verdicts
+
+
+def iter_files(root, recursive=True):
+    """Yield paths of regular files under root; symlinks are not followed."""
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if recursive:
+                                stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            if not entry.name.lower().endswith(READY_IGNORE_SUFFIXES):
+                                yield entry.path
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"[Baseline] Cannot read {folder}: {e}")
+
+
+class BaselineScan:
+    def __init__(self, folders, recursive=WATCH_RECURSIVE, workers=BASELINE_WORKERS,
+                 progress_interval=BASELINE_PROGRESS_INTERVAL):
+        self.folders = list(folders)
+        self.recursive = recursive
+        self.progress_interval = progress_interval
+        # no put timeout: the walk waits for the workers instead of dropping files
+        self.pipeline = ScanPipeline(workers=workers, put_timeout=None, handler=self._scan_existing)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._counters = {"found": 0, "cached": 0, "hashed": 0, "known": 0, "scanned": 0}
+        self.started_at = None
+        self.finished_at = None
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _scan_existing(self, path):
+        hashes = file_cache.lookup_path(path)
+        if hashes is None:
+            hashes = hash_file(path)
+            self._count("hashed")
+        else:
+            self._count("cached")
+
+        sha256 = hashes["sha256"]
+        known = history_db.get_cached_result(sha256, "sha256")
+        # any detection (malicious or suspicious) is scanned and alerted again
+        if known and not verdict.of(known["result"]).detections \
+                and not local_db.is_malicious_local(sha256):
+            self._count("known")
+            return
+
+        # unknown or flagged: full scan (hashes come from file_cache now)
+        process_file(path, event_type="baseline_scan")
+        self._count("scanned")
+
+    def run(self):
+        self.started_at = time.time()
+        self.pipeline.start()
+        done = threading.Event()
+        reporter = threading.Thread(target=self._report_until, args=(done,), daemon=True)
+        reporter.start()
+        try:
+            for folder in self.folders:
+                print(f"[Baseline] Scanning existing files in {folder}"
+                      f"{' (recursive)' if self.recursive else ''}")
+                for path in iter_files(folder, self.recursive):
+                    if self._stop.is_set():
+                        break
+                    self.pipeline.submit(path)
+                    self._count("found")
+        finally:
+            self.pipeline.stop(drain=not self._stop.is_set())
+            if not self._stop.is_set():
+                wait_for_verdicts()
+            self.finished_at = time.time()
+            done.set()
+            reporter.join()
+        self._report(final=True)
+        return self.stats()
+
+    def _report_until(self, done):
+        while not done.wait(self.progress_interval):
+            self._report()
+
+    def stop(self):
+        """Stop walking; files already queued are discarded."""
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        pipeline = self.pipeline.stats()
+        counters["done"] = counters["known"] + counters["scanned"]
+        counters["failed"] = pipeline["failed"]
+        counters["queue_depth"] = pipeline["queue_depth"]
+        end = self.finished_at or time.time()
+        counters["elapsed"] = round(end - self.started_at, 1) if self.started_at else 0.0
+        counters["running"] = self.started_at is not None and self.finished_at is None
+        return counters
+
+    def _report(self, final=False):
+        s = self.stats()
+        rate = s["done"] / s["elapsed"] if s["elapsed"] else 0.0
+        prefix = "Finished" if final else "Progress"
+        print(f"[Baseline] {prefix}: {s['done']}/{s['found']} files in {s['elapsed']:.0f}s "
+              f"({rate:.0f}/s): {s['known']} already known, {s['scanned']} scanned, "
+              f"{s['hashed']} hashed, {s['cached']} unchanged, {s['failed']} failed")
+
+
+def start_baseline(folders, recursive=WATCH_RECURSIVE):
+    """Run a BaselineScan on a background thread and return it."""
+    scan = BaselineScan(folders, recursive)
+    threading.Thread(target=scan.run, name="baseline-scan", daemon=True).start()
+    return scan
+
+
+def main():
+    from watcher_config import WATCH_FOLDERS
+
+    parser = argparse.ArgumentParser(description="Inventory the files already in the watch folders")
+    parser.add_argument("folders", nargs="*", help="default: the configured watch folders")
+    parser.add_argument("--recursive", action="store_true", default=WATCH_RECURSIVE)
+    parser.add_argument("--workers", type=int, default=BASELINE_WORKERS)
+    args = parser.parse_args()
+
+    local_db.init_db()
+    history_db.init_db()
+    file_cache.init_db()
+
+    BaselineScan(args.folders or WATCH_FOLDERS, args.recursive, args.workers).run()
+    shutdown_hash_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# batch_scan.py
+# Bulk IOC lookups for /api/scan/batch.
+#
+# A batch of sha256s and URLs is answered in three passes: local_db and
+# history_db in bulk (one set lookup, one IN query per 500 keys), then the
+# misses go to VirusTotal at PRIORITY_BATCH - hashes through the shared
+# coalescer, URLs as url_jobs - and each result is yielded as soon as it
+# lands. Whatever is still waiting at the deadline is reported as pending;
+# those lookups keep running and their verdicts end up in history_db.
+import re
+import time
+from concurrent.futures import TimeoutError, as_completed
+
+import history_db
+import local_db
+import url_jobs
+import verdict
+from hash_lookup import get_coalescer
+from ratelimit import PRIORITY_BATCH
+
+MAX_ITEMS = 10000             # IOCs accepted in one request
+DEFAULT_WAIT = 60             # seconds to wait on VT before reporting the rest as pending
+MAX_WAIT = 600
+
+_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+
+def _line(ioc, ioc_type, source, result, engines=False):
+    summary = verdict.of(result)
+    line = {
+        "ioc": ioc,
+        "type": ioc_type,
+        "source": source,
+        "verdict": summary.label,
+        "counts": summary.counts,
+        "ratio": summary.ratio,
+        "top": [list(t) for t in summary.top],
+    }
+    if engines:
+        line["engines"] = (result or {}).get("engines", {})
+    return line
+
+
+def items(body):
+    """(hashes, urls) as sent in a request body {"hashes": [...], "urls": [...]};
+    ValueError unless each is a list (or missing)."""
+    raw = []
+    for field in ("hashes", "urls"):
+        values = body.get(field)
+        if values is None:
+            values = []
+        if not isinstance(values, list):
+            raise ValueError(f"\"{field}\" must be a list")
+        raw.append(values)
+    return tuple(raw)
+
+
+def parse(raw_hashes, raw_urls):
+    """(hashes, urls, errors) from the lists returned by items()."""
+    hashes, urls, errors = [], [], []
+    for value in raw_hashes:
+        sha256 = str(value).strip().lower()
+        if _SHA256.match(sha256):
+            hashes.append(sha256)
+        else:
+            errors.append({"ioc": value, "type": "sha256", "source": "invalid",
+                           "error": "not a sha256"})
+    for value in raw_urls:
+        url = str(value).strip()
+        if url.startswith(("http://", "https://")):
+            urls.append(url)
+        else:
+            errors.append({"ioc": value, "type": "url", "source": "invalid",
+                           "error": "not an http(s) URL"})
+    return list(dict.fromkeys(hashes)), list(dict.fromkeys(urls)), errors
+
+
+def scan(hashes, urls, timeout=DEFAULT_WAIT, engines=False):
+    """Yield one result dict per IOC, known verdicts first."""
+    deadline = time.monotonic() + min(timeout, MAX_WAIT)
+
+    # 1) local signatures
+    malicious = local_db.filter_malicious(hashes)
+    for sha256 in malicious:
+        yield _line(sha256, "sha256", "local", local_db.local_verdict(), engines)
+
+    # 2) history, one bulk query per key type
+    rest = [h for h in hashes if h not in malicious]
+    cached = history_db.get_cached_results(rest, "sha256")
+    for sha256, entry in cached.items():
+        yield _line(sha256, "sha256", "history", entry["result"], engines)
+    cached_urls = history_db.get_cached_results(urls, "url")
+    for url, entry in cached_urls.items():
+        yield _line(url, "url", "history", entry["result"], engines)
+
+    # 3) misses, under the VT quota at batch priority
+    waiting = {}
+    coalescer = get_coalescer(PRIORITY_BATCH)
+    for sha256 in rest:
+        if sha256 not in cached:
+            waiting[coalescer.lookup(sha256)] = (sha256, "sha256", None)
+    for url in urls:
+        if url not in cached_urls:
+            job_id = url_jobs.submit(url, PRIORITY_BATCH)
+            waiting[url_jobs.watch(job_id)] = (url, "url", job_id)
+
+    try:
+        for future in as_completed(list(waiting), timeout=max(0, deadline - time.monotonic())):
+            ioc, ioc_type, job_id = waiting.pop(future)
+            if ioc_type == "url":
+                status, result = future.result()
+                if status != "completed":
+                    yield {"ioc": ioc, "type": "url", "source": "vt", "error": f"scan {status}"}
+                    continue
+            else:
+                result = future.result()
+                if not result:
+                    yield {"ioc": ioc, "type": "sha256", "source": "vt", "error": "lookup failed"}
+                    continue
+            yield _line(ioc, ioc_type, "vt", result, engines)
+    except TimeoutError:
+        pass
+
+    for ioc, ioc_type, job_id in waiting.values():
+        line = {"ioc": ioc, "type": ioc_type, "source": "pending"}
+        if job_id:
+            line["job_id"] = job_id
+        yield line
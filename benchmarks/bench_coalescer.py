@@ -0,0 +1,127 @@
+# benchmarks/bench_coalescer.py
+# A 1,000-file drop across several watch folders against a stub VT server:
+# one lookup per file (the old watcher path) vs. hash_lookup.LookupCoalescer,
+# fed directly and through a ScanPipeline with SCAN_WORKERS workers (the
+# watcher path, where workers hand off lookups without waiting on them).
+#
+#   python -m benchmarks.bench_coalescer [--files 1000] [--unique 400] [--latency 0.02]
+#
+# Reports wall time and, more importantly under a 4 req/min quota, the
+# number of requests that actually reached VT.
+import argparse
+import hashlib
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import SCAN_WORKERS
+
+import history_db
+import local_db
+import hash_lookup
+from benchmarks.fake_vt import serve
+from scan_pipeline import ScanPipeline
+from vt import VTClient, normalize_file_report
+
+
+def _hashes(files, unique, known):
+    pool = [hashlib.sha256(f"file-{i}".encode()).hexdigest() for i in range(unique)]
+    for sha256 in pool[:known]:
+        history_db.add_or_update_cache(sha256, "sha256", {"counts": {}, "engines": {"X": {"result": "clean"}}})
+    history_db.clear_cache()
+    return [random.choice(pool) for _ in range(files)]
+
+
+def _naive(client, sha256):
+    # what each on_created did before: history lookup, then VT for misses
+    if local_db.is_malicious_local(sha256):
+        return
+    if history_db.get_cached_result(sha256, "sha256"):
+        return
+    raw = client.get_file_report(sha256)
+    if raw is not None:
+        history_db.add_or_update_cache(sha256, "sha256", normalize_file_report(raw))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--unique", type=int, default=400)
+    parser.add_argument("--known", type=int, default=100, help="hashes already in history_db")
+    parser.add_argument("--latency", type=float, default=0.02, help="stub VT latency per request")
+    parser.add_argument("--threads", type=int, default=32, help="concurrent watcher threads")
+    parser.add_argument("--rate", type=float, default=1200, help="VT quota, requests per minute")
+    args = parser.parse_args()
+
+    server, fake, base_url = serve(latency=args.latency)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        local_db.DB_FILE = os.path.join(tmp, "malware_hashes.db")
+        history_db.DB_FILE = os.path.join(tmp, "scan_history.db")
+        local_db.init_db()
+        history_db.init_db()
+
+        # every file is processed by one of `threads` watcher threads
+        drop = _hashes(args.files, args.unique, args.known)
+
+        client = VTClient(api_key="bench", base_url=base_url, rate_per_min=args.rate)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as pool:
+            list(pool.map(lambda h: _naive(client, h), drop))
+        naive_time = time.perf_counter() - start
+        naive_calls = fake.counts["requests"]
+
+        # reset the history to the same starting point
+        with history_db.get_connection(history_db.DB_FILE) as conn:
+            conn.execute("DELETE FROM scan_history")
+        history_db.clear_cache()
+        drop = _hashes(args.files, args.unique, args.known)
+        fake.counts["requests"] = 0
+
+        client = VTClient(api_key="bench", base_url=base_url, rate_per_min=args.rate)
+        coalescer = hash_lookup.LookupCoalescer(client=client, vt_workers=args.threads)
+        start = time.perf_counter()
+        # the drop is enqueued as it arrives; results are collected afterwards
+        futures = [coalescer.lookup(h) for h in drop]
+        for f in futures:
+            f.result()
+        batched_time = time.perf_counter() - start
+        batched_calls = fake.counts["requests"]
+
+        # the same drop handed over by pipeline workers (hashing is not timed)
+        with history_db.get_connection(history_db.DB_FILE) as conn:
+            conn.execute("DELETE FROM scan_history")
+        history_db.clear_cache()
+        drop = _hashes(args.files, args.unique, args.known)
+        fake.counts["requests"] = 0
+
+        client = VTClient(api_key="bench", base_url=base_url, rate_per_min=args.rate)
+        piped = hash_lookup.LookupCoalescer(client=client, vt_workers=args.threads)
+        futures = []
+        pipeline = ScanPipeline(workers=SCAN_WORKERS, put_timeout=None,
+                                handler=lambda h: futures.append(piped.lookup(h))).start()
+        start = time.perf_counter()
+        for h in drop:
+            pipeline.submit(h)
+        pipeline.stop(drain=True)
+        for f in futures:
+            f.result()
+        piped_time = time.perf_counter() - start
+        piped_calls = fake.counts["requests"]
+
+    server.shutdown()
+
+    print(f"{args.files} files, {args.unique} distinct hashes, {args.known} already known, "
+          f"quota {args.rate:.0f}/min")
+    print(f"per-file lookups   {naive_time:7.2f}s  {args.files / naive_time:8.0f} files/s  VT requests {naive_calls}")
+    print(f"coalesced lookups  {batched_time:7.2f}s  {args.files / batched_time:8.0f} files/s  VT requests {batched_calls}")
+    print(f"via ScanPipeline   {piped_time:7.2f}s  {args.files / piped_time:8.0f} files/s  VT requests {piped_calls}"
+          f"  ({SCAN_WORKERS} workers)")
+    print(f"coalescer stats    {coalescer.stats}")
+    print(f"pipeline stats     {piped.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# benchmarks/bench_db.py
+# Lookups/sec for the local signature DB and the scan history, comparing
+# the old connect-per-call pattern with the pooled connections in db_pool.
+#
+#   python -m benchmarks.bench_db [--rows 100000] [--lookups 20000]
+import argparse
+import hashlib
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import db_pool
+import history_db
+import local_db
+
+
+def _digest(i):
+    return hashlib.sha256(str(i).encode()).hexdigest()
+
+
+def _seed(rows):
+    with db_pool.get_connection(local_db.DB_FILE) as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO malware_hashes (sha256, added_at) VALUES (?, '')",
+            ((_digest(i),) for i in range(rows)),
+        )
+    with db_pool.get_connection(history_db.DB_FILE) as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO scan_history (key, key_type, last_scanned) VALUES (?, 'sha256', '')",
+            ((_digest(i),) for i in range(rows)),
+        )
+
+
+# the pre-pool implementations, kept here only for comparison
+def _old_is_malicious_local(sha256):
+    conn = sqlite3.connect(local_db.DB_FILE)
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM malware_hashes WHERE sha256 = ?", (sha256,))
+    row = cur.fetchone()
+    conn.close()
+    return row is not None
+
+
+def _old_get_cached_result(key, key_type):
+    conn = sqlite3.connect(history_db.DB_FILE)
+    cur = conn.cursor()
+    cur.execute("SELECT malicious, suspicious, clean, harmless, engines, extra, last_scanned "
+                "FROM scan_history WHERE key=? AND key_type=?",
+                (key, key_type))
+    row = cur.fetchone()
+    conn.close()
+    return row
+
+
+def _rate(fn, keys):
+    start = time.perf_counter()
+    for k in keys:
+        fn(k)
+    return len(keys) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        local_db.DB_FILE = os.path.join(tmp, "malware_hashes.db")
+        history_db.DB_FILE = os.path.join(tmp, "scan_history.db")
+        local_db.init_db()
+        history_db.init_db()
+        _seed(args.rows)
+        local_db.load_signatures()
+
+        # half known, half unknown hashes
+        keys = [_digest(random.randrange(args.rows * 2)) for _ in range(args.lookups)]
+
+        cases = [
+            ("local_db.is_malicious_local", _old_is_malicious_local, local_db.is_malicious_local),
+            ("history_db.get_cached_result",
+             lambda k: _old_get_cached_result(k, "sha256"),
+             lambda k: history_db.get_cached_result(k, "sha256")),
+        ]
+        for name, before, after in cases:
+            old = _rate(before, keys)
+            new = _rate(after, keys)
+            print(f"{name:32s} before {old:10.0f}/s   after {new:10.0f}/s   x{new / old:.1f}")
+
+        db_pool.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# benchmarks/bench_history.py
+# The scan history at 1M rows: the v0 schema (one result_json blob per
+# verdict, no indexes) against v1 (typed counts, packed engine tables,
+# last_scanned indexes), including the one-off migration between them.
+#
+#   python -m benchmarks.bench_history [--rows 1000000] [--engines 70]
+#
+# Measures the /history list view, the purge predicates, point lookups and
+# the database size on disk.
+import argparse
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import db_pool
+import history_db
+
+CATEGORIES = ["undetected"] * 12 + ["harmless"] * 4 + ["malicious", "suspicious", "type-unsupported"]
+
+# the v0 table, kept here only to seed and time the old queries
+V0_SCHEMA = """
+CREATE TABLE scan_history (
+    key TEXT PRIMARY KEY,
+    key_type TEXT,
+    result_json TEXT,
+    last_scanned TEXT
+);
+"""
+
+
+def _digest(i):
+    return hashlib.sha256(str(i).encode()).hexdigest()
+
+
+def _results(engines, variants=500):
+    # a pool of realistic engine tables; rows pick from it
+    names = [f"Engine{i:02d}" for i in range(engines)]
+    pool = []
+    for _ in range(variants):
+        table = {n: {"result": random.choice(CATEGORIES), "engine_name": n} for n in names}
+        counts = {"malicious": 0, "suspicious": 0, "clean": 0, "harmless": 0}
+        for info in table.values():
+            key = info["result"] if info["result"] in counts else "clean"
+            counts[key] += 1
+        pool.append(json.dumps({"counts": counts, "engines": table}))
+    # some "VT has no record" verdicts
+    pool += [json.dumps({"counts": {"malicious": 0, "suspicious": 0, "clean": 0, "harmless": 0},
+                         "engines": {}})] * (variants // 10)
+    return pool
+
+
+def _seed_v0(path, rows, engines, batch=20000):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute(V0_SCHEMA)
+    pool = _results(engines)
+    now = datetime.utcnow()
+    for start in range(0, rows, batch):
+        conn.executemany(
+            "INSERT INTO scan_history VALUES (?, 'sha256', ?, ?)",
+            ((_digest(i), random.choice(pool),
+              (now - timedelta(seconds=random.randrange(60 * 86400))).isoformat())
+             for i in range(start, min(start + batch, rows))),
+        )
+        conn.commit()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+    conn.close()
+
+
+def _timed(fn, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def _size(path):
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p)) / (1024 * 1024)
+
+
+def _v0_list(conn, limit):
+    # the old /history view: sort without an index, decode every row
+    rows = conn.execute(
+        "SELECT key, key_type, result_json, last_scanned FROM scan_history ORDER BY last_scanned DESC LIMIT ?",
+        (limit,),
+    ).fetchall()
+    return [(key, key_type, json.loads(result_json), date) for key, key_type, result_json, date in rows]
+
+
+def _v0_negative(conn, cutoff):
+    return conn.execute(
+        "SELECT COUNT(*) FROM scan_history WHERE (json_extract(result_json, '$.engines') IS NULL "
+        "OR json_extract(result_json, '$.engines') = '{}') AND last_scanned < ?", (cutoff,),
+    ).fetchone()[0]
+
+
+def _v0_lookup(conn, key):
+    row = conn.execute("SELECT result_json, last_scanned FROM scan_history WHERE key=? AND key_type=?",
+                       (key, "sha256")).fetchone()
+    return row and json.loads(row[0])
+
+
+def _v1_negative(conn, cutoff):
+    return conn.execute(
+        "SELECT COUNT(*) FROM scan_history WHERE engine_count = 0 AND last_scanned < ?", (cutoff,),
+    ).fetchone()[0]
+
+
+def _v1_expired(conn, cutoff):
+    return conn.execute(
+        "SELECT COUNT(*) FROM scan_history WHERE key_type='sha256' AND last_scanned < ?", (cutoff,),
+    ).fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--engines", type=int, default=70)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--list", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = history_db.DB_FILE = os.path.join(tmp, "scan_history.db")
+        history_db.CACHE_MAX_ENTRIES = 0      # every lookup goes to SQLite
+        keys = [_digest(random.randrange(args.rows * 2)) for _ in range(args.lookups)]
+        cutoff = (datetime.utcnow() - timedelta(days=30)).isoformat()
+
+        t, _ = _timed(lambda: _seed_v0(path, args.rows, args.engines))
+        print(f"seeded {args.rows} v0 rows ({args.engines} engines each) in {t:.1f}s, {_size(path):.0f} MB")
+
+        conn = db_pool.get_connection(path)
+        v0 = {
+            "list": _timed(lambda: _v0_list(conn, args.list), 3)[0],
+            "negative": _timed(lambda: _v0_negative(conn, cutoff))[0],
+            "expired": _timed(lambda: conn.execute(
+                "SELECT COUNT(*) FROM scan_history WHERE key_type='sha256' AND last_scanned < ?",
+                (cutoff,)).fetchone())[0],
+            "lookup": _timed(lambda: [_v0_lookup(conn, k) for k in keys])[0] / len(keys),
+            "size": _size(path),
+        }
+
+        migrate, _ = _timed(history_db.init_db)
+        v1 = {
+            "list": _timed(lambda: history_db.list_summaries(args.list), 3)[0],
+            "negative": _timed(lambda: _v1_negative(conn, cutoff))[0],
+            "expired": _timed(lambda: _v1_expired(conn, cutoff))[0],
+            "lookup": _timed(lambda: [history_db.get_cached_result(k, "sha256") for k in keys])[0] / len(keys),
+            "size": _size(path),
+        }
+
+        print(f"migration v0 -> v1 (incl. VACUUM): {migrate:.1f}s")
+        print(f"{'':28s} {'v0':>12s} {'v1':>12s}")
+        print(f"{'/history list (' + str(args.list) + ' rows)':28s} {v0['list'] * 1000:10.1f}ms {v1['list'] * 1000:10.1f}ms")
+        print(f"{'purge: negative verdicts':28s} {v0['negative'] * 1000:10.1f}ms {v1['negative'] * 1000:10.1f}ms")
+        print(f"{'purge: expired sha256':28s} {v0['expired'] * 1000:10.1f}ms {v1['expired'] * 1000:10.1f}ms")
+        print(f"{'point lookup':28s} {v0['lookup'] * 1e6:10.1f}us {v1['lookup'] * 1e6:10.1f}us")
+        print(f"{'database size':28s} {v0['size']:10.0f}MB {v1['size']:10.0f}MB")
+
+        db_pool.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# benchmarks/fake_notify.py
+# Local stand-ins for a Discord webhook and an SMTP server, for exercising
+# notifier's dispatcher without sending real alerts.
+#
+#   python -m benchmarks.fake_notify --alerts 500
+#
+# fires a burst of alerts through a NotificationDispatcher wired to both
+# stubs and reports how many messages and SMTP connections it took.
+#
+# Behaviour:
+#   POST /webhook   204; every --throttle-every'th request gets a 429 with
+#                   {"retry_after": 0.5} (0 disables)
+#   SMTP            accepts everything, no TLS, no auth; counts connections
+import argparse
+import json
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeWebhook:
+    def __init__(self, throttle_every=0):
+        self.throttle_every = throttle_every
+        self.messages = []
+        self.counts = {"requests": 0, "throttled": 0}
+        self.lock = threading.Lock()
+
+
+def _webhook_handler(hook):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            with hook.lock:
+                hook.counts["requests"] += 1
+                throttle = hook.throttle_every and hook.counts["requests"] % hook.throttle_every == 0
+                if throttle:
+                    hook.counts["throttled"] += 1
+                else:
+                    hook.messages.append(body.get("content", ""))
+            if throttle:
+                self.send_response(429)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(b'{"retry_after": 0.5}')
+                return
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class FakeSmtp:
+    def __init__(self):
+        self.messages = []
+        self.connections = 0
+        self.lock = threading.Lock()
+
+
+def _smtp_handler(smtp):
+    class Handler(socketserver.StreamRequestHandler):
+        def reply(self, line):
+            self.wfile.write((line + "\r\n").encode())
+
+        def handle(self):
+            with smtp.lock:
+                smtp.connections += 1
+            self.reply("220 fake-smtp")
+            data = None
+            while True:
+                raw = self.rfile.readline()
+                if not raw:
+                    return
+                line = raw.decode(errors="replace").rstrip("\r\n")
+                if data is not None:
+                    if line == ".":
+                        with smtp.lock:
+                            smtp.messages.append("\n".join(data))
+                        data = None
+                        self.reply("250 queued")
+                    else:
+                        data.append(line)
+                    continue
+                cmd = line.split(" ", 1)[0].upper()
+                if cmd == "DATA":
+                    data = []
+                    self.reply("354 end with .")
+                elif cmd == "QUIT":
+                    self.reply("221 bye")
+                    return
+                else:
+                    self.reply("250 ok")
+
+    return Handler
+
+
+def serve(throttle_every=0):
+    """Start both stubs. Returns (webhook_url, FakeWebhook, smtp_port, FakeSmtp, servers)."""
+    hook = FakeWebhook(throttle_every)
+    http = ThreadingHTTPServer(("127.0.0.1", 0), _webhook_handler(hook))
+    http.daemon_threads = True
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+
+    smtp = FakeSmtp()
+    tcp = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _smtp_handler(smtp))
+    tcp.daemon_threads = True
+    threading.Thread(target=tcp.serve_forever, daemon=True).start()
+
+    webhook_url = f"http://127.0.0.1:{http.server_address[1]}/webhook"
+    return webhook_url, hook, tcp.server_address[1], smtp, (http, tcp)
+
+
+def main():
+    import notifier
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--alerts", type=int, default=500)
+    parser.add_argument("--window", type=float, default=1.0)
+    parser.add_argument("--spread", type=float, default=3.0, help="seconds the burst is spread over")
+    parser.add_argument("--throttle-every", type=int, default=3)
+    args = parser.parse_args()
+
+    webhook_url, hook, smtp_port, smtp, servers = serve(args.throttle_every)
+    sender = notifier.SmtpSender("127.0.0.1", smtp_port, starttls=False,
+                                 sender="alerts@localhost", recipients=["soc@localhost"])
+    channels = [
+        notifier.Channel("Discord", lambda subject, body: notifier.post_discord(webhook_url, body),
+                         rate_per_min=30, max_length=notifier.MAX_DISCORD_MESSAGE),
+        notifier.Channel("Email", sender.send, rate_per_min=10,
+                         on_idle=lambda force=False: sender.close() if force else sender.close_if_idle()),
+    ]
+    dispatcher = notifier.NotificationDispatcher(channels, window=args.window)
+
+    start = time.perf_counter()
+    submit_time = 0.0
+    for i in range(args.alerts):
+        t = time.perf_counter()
+        dispatcher.submit({"event_type": "watchdog_file_created", "text": f"alert {i}",
+                           "line": f"watchdog_file_created: `/drop/file{i}` (1 malicious, 0 suspicious)"})
+        submit_time += time.perf_counter() - t
+        time.sleep(args.spread / args.alerts)
+    dispatcher.stop(timeout=30)
+    total_time = time.perf_counter() - start
+    for server in servers:
+        server.shutdown()
+
+    print(f"{args.alerts} alerts over {args.spread:.1f}s, digest window {args.window:.1f}s")
+    print(f"submit() took {submit_time * 1000:.1f}ms in total; everything delivered after {total_time:.1f}s")
+    print(f"webhook: {len(hook.messages)} messages, {hook.counts['throttled']} throttled requests retried")
+    print(f"smtp:    {len(smtp.messages)} messages over {smtp.connections} connection(s)")
+    print(f"channels {[(c.name, c.stats) for c in channels]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# benchmarks/fake_vt.py
+# Minimal local stand-in for the VirusTotal v3 API, for exercising VTClient
+# and the scan paths without a real key or quota.
+#
+#   python -m benchmarks.fake_vt --port 8765 --quota 240 --latency 0.05
+#
+# then set "vt_base_url": "http://127.0.0.1:8765/api/v3" in settings.json.
+#
+# Behaviour:
+#   GET  /api/v3/files/<sha256>   404 for hashes starting with "0", a report
+#                                 flagged by 5 engines for hashes starting
+#                                 with "f", clean otherwise
+#   POST /api/v3/urls             returns an analysis id
+#   GET  /api/v3/analyses/<id>    "queued" for the first --polls requests,
+#                                 then "completed"
+# Requests beyond --quota per rolling minute get a 429 with Retry-After.
+import argparse
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENGINES = [f"Engine{i:02d}" for i in range(20)]
+
+
+def _results(malicious):
+    return {
+        name: {"category": "malicious" if i < malicious else "undetected",
+               "engine_name": name, "result": None}
+        for i, name in enumerate(ENGINES)
+    }
+
+
+class FakeVT:
+    def __init__(self, quota=0, latency=0.0, polls=2):
+        self.quota = quota
+        self.latency = latency
+        self.polls = polls
+        self.calls = deque()
+        self.analyses = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.counts = {"requests": 0, "throttled": 0}
+
+    def admit(self):
+        now = time.monotonic()
+        with self.lock:
+            self.counts["requests"] += 1
+            while self.calls and now - self.calls[0] > 60:
+                self.calls.popleft()
+            if self.quota and len(self.calls) >= self.quota:
+                self.counts["throttled"] += 1
+                return False
+            self.calls.append(now)
+            return True
+
+
+def make_handler(vt):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body=None, headers=None):
+            data = json.dumps(body or {}).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _gate(self):
+            if vt.latency:
+                time.sleep(vt.latency)
+            if not vt.admit():
+                self._send(429, {"error": {"code": "QuotaExceededError"}}, {"Retry-After": "1"})
+                return False
+            return True
+
+        def do_GET(self):
+            if not self._gate():
+                return
+            parts = self.path.strip("/").split("/")
+            if parts[:3] == ["api", "v3", "files"] and len(parts) == 4:
+                sha = parts[3].lower()
+                if sha.startswith("0"):
+                    return self._send(404, {"error": {"code": "NotFoundError"}})
+                malicious = 5 if sha.startswith("f") else 0
+                return self._send(200, {"data": {"id": sha, "attributes": {
+                    "last_analysis_stats": {"malicious": malicious, "suspicious": 0,
+                                            "undetected": len(ENGINES) - malicious, "harmless": 0},
+                    "last_analysis_results": _results(malicious),
+                }}})
+            if parts[:3] == ["api", "v3", "analyses"] and len(parts) == 4:
+                with vt.lock:
+                    entry = vt.analyses.get(parts[3])
+                    if entry is None:
+                        return self._send(404)
+                    entry["polls"] += 1
+                    done = entry["polls"] > vt.polls
+                attrs = {"status": "completed" if done else "queued"}
+                if done:
+                    attrs["results"] = _results(3 if "evil" in entry["url"] else 0)
+                return self._send(200, {"data": {"id": parts[3], "attributes": attrs}})
+            self._send(404)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length).decode()
+            if not self._gate():
+                return
+            if self.path.rstrip("/") == "/api/v3/urls":
+                analysis_id = f"u-{next(vt.ids)}"
+                with vt.lock:
+                    vt.analyses[analysis_id] = {"url": body, "polls": 0}
+                return self._send(200, {"data": {"type": "analysis", "id": analysis_id}})
+            self._send(404)
+
+    return Handler
+
+
+def serve(port=0, **kwargs):
+    """Start a fake VT server in a background thread. Returns (server, FakeVT, base_url)."""
+    vt = FakeVT(**kwargs)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(vt))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/api/v3"
+    return server, vt, base_url
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--quota", type=int, default=0, help="requests per minute, 0 = unlimited")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--polls", type=int, default=2)
+    args = parser.parse_args()
+
+    server, _, base_url = serve(args.port, quota=args.quota, latency=args.latency, polls=args.polls)
+    print(f"[FakeVT] Serving {base_url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
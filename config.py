@@ -19,10 +19,28 @@ def load_settings():
 settings = load_settings()
 
 
+def _positive_float(key, default):
+    # blank, malformed or non-positive values fall back to the default
+    try:
+        value = float(settings.get(key, default))
+    except (TypeError, ValueError):
+        return default
+    return value if value > 0 else default
+
+
+def _positive_int(key, default):
+    value = _positive_float(key, default)
+    return int(value) if value >= 1 else default
+
+
 # -----------------------
 # VIRUSTOTAL API
 # -----------------------
 VT_API_KEY = settings.get("vt_api_key", "")
+VT_BASE_URL = settings.get("vt_base_url", "https://www.virustotal.com/api/v3")
+VT_RATE_PER_MIN = _positive_float("vt_rate_per_min", 4)    # free tier: 4 requests/minute
+VT_MAX_RETRIES = 3
+VT_INTERACTIVE_RETRIES = 1    # a user is waiting: fail fast when VT is unreachable
 
 
 # -----------------------
@@ -34,20 +52,82 @@ WATCH_FOLDERS = [
 ]
 
 
+# -----------------------
+# HASHING
+# -----------------------
+# md5 and sha256 are always computed; e.g. "sha1,ssdeep" adds more
+HASH_ALGORITHMS = [
+    a.strip().lower() for a in settings.get("hash_algorithms", "md5,sha256").split(",")
+    if a.strip()
+]
+
+
+# -----------------------
+# SCAN PIPELINE (watchers)
+# -----------------------
+SCAN_WORKERS = _positive_int("scan_workers", os.cpu_count() or 2)
+SCAN_QUEUE_SIZE = _positive_int("scan_queue_size", 1000)
+SCAN_POOL = settings.get("scan_pool", "thread")       # "thread" or "process" for hashing
+SCAN_PUT_TIMEOUT = 5                                  # seconds an observer waits on a full queue
+
+# file readiness: a file is scanned when its writer closes it (inotify) or,
+# as a fallback, once it has been quiet for READY_QUIET seconds
+READY_QUIET = _positive_float("ready_quiet", 2)
+READY_QUIET_WITH_CLOSE = 10               # fallback debounce when close events are available
+READY_MAX_WAIT = _positive_float("ready_max_wait", 600)   # budget before giving up on a file
+READY_IGNORE_SUFFIXES = (".part", ".crdownload", ".download", ".partial", ".tmp")
+
+WATCH_RECURSIVE = settings.get("watch_recursive", "no") == "yes"
+BASELINE_SCAN = settings.get("baseline_scan", "yes") == "yes"   # inventory existing files at startup
+BASELINE_PROGRESS_INTERVAL = 10                                  # seconds between progress lines
+WATCHER_STATUS_FILE = "watcher_status.json"   # written by watcher_service, read by the web app
+WATCHER_STATUS_INTERVAL = 2                    # seconds between status writes / settings checks
+BASELINE_WORKERS = 32         # mostly waiting on the shared hash pool and batched verdict lookups
+
+
+# -----------------------
+# UPLOADS
+# -----------------------
+UPLOAD_FOLDER = "uploads"
+UPLOAD_MAX_BYTES = int(_positive_float("upload_max_mb", 256) * 1024 * 1024)
+UPLOAD_SPOOL_MEMORY = 8 * 1024 * 1024     # uploads up to this size never touch the disk until stored
+
+# kept uploads live in UPLOAD_FOLDER/<sha256[:2]>/, one copy per content;
+# the oldest are evicted past either limit
+QUARANTINE_MAX_BYTES = int(float(settings.get("quarantine_max_mb", 2048)) * 1024 * 1024)
+QUARANTINE_MAX_AGE = float(settings.get("quarantine_max_age_days", 30)) * 86400
+QUARANTINE_COMPRESS = settings.get("quarantine_compress", "no") == "yes"   # zstd, needs the zstandard package
+QUARANTINE_ZSTD_LEVEL = 3
+
+
 # -----------------------
 # NOTIFICATION SETTINGS
 # -----------------------
 ENABLE_EMAIL = settings.get("enable_email", "no") == "yes"
 ENABLE_TELEGRAM = settings.get("enable_telegram", "no") == "yes"
-ENABLE_DISCORD = settings.get("enable_discord", "no") == "yes"
+ENABLE_DISCORD = settings.get("enable_discord", "yes") == "yes"   # the webhook was always used when set
 
 EMAIL_TO = [settings.get("email_to")] if settings.get("email_to") else []
+EMAIL_SMTP_SERVER = settings.get("smtp_server", "")
+EMAIL_SMTP_PORT = _positive_int("smtp_port", 587)
+EMAIL_USERNAME = settings.get("smtp_username", "")
+EMAIL_PASSWORD = settings.get("smtp_password", "")
+EMAIL_STARTTLS = settings.get("smtp_starttls", "yes") == "yes"
 
 TELEGRAM_BOT_TOKEN = settings.get("telegram_bot", "")
 TELEGRAM_CHAT_ID = settings.get("telegram_chat_id", "")
 
 DISCORD_WEBHOOK_URL = settings.get("discord_webhook", "")
 
+# dispatcher: alerts arriving within the window go out as one digest
+NOTIFY_DIGEST_WINDOW = 5                  # seconds
+NOTIFY_MAX_RETRIES = 3
+NOTIFY_MAX_RATE_LIMITED = 10              # 429 waits per message before it is dropped
+NOTIFY_RATE_PER_MIN = {"discord": 30, "telegram": 20, "email": 10}
+SMTP_IDLE_TIMEOUT = 60                    # seconds an unused SMTP connection stays open
+# repeat alerts for the same sha256/URL within this many seconds are counted, not sent
+NOTIFY_SUPPRESS_WINDOW = float(settings.get("alert_suppress_window", 3600))
+
 
 # -----------------------
 # SYSTEM CONTROL
@@ -58,6 +138,14 @@ SCANNING_ENABLED = settings.get("scanning_enabled", "yes")
 # -----------------------
 # LOGGER CONFIG (STATIC)
 # -----------------------
-LOG_MODE = "json"             # "json" or "sqlite"
+LOG_MODE = "jsonl"            # "jsonl", "json" (legacy) or "sqlite"
 JSON_LOG_FILE = "logs.json"
+JSONL_LOG_FILE = "logs.jsonl"
 SQLITE_DB_FILE = "logs.db"
+LOG_INDEX_DB = "logs_index.db"            # offset index over the jsonl files
+
+# jsonl backend: fsync policy is "always", "interval" or "never"
+JSONL_FSYNC = "interval"
+JSONL_FSYNC_INTERVAL = 5                  # seconds between fsyncs for "interval"
+JSONL_MAX_BYTES = 50 * 1024 * 1024        # rotate once the active file passes this
+JSONL_BACKUP_COUNT = 10                   # rotated segments to keep (0 = keep all)
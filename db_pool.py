@@ -0,0 +1,111 @@
+# db_pool.py
+# Pooled SQLite connections shared by history_db, local_db, the sqlite
+# logger backend and the log index.
+#
+# A thread checks a connection out on its first query against a database
+# and keeps it until the thread ends; then the connection goes back to an
+# idle pool for the next thread. The web server starts a thread per
+# request, so requests reuse a handful of warm connections instead of each
+# opening (and leaking) their own. Connections are opened in WAL mode
+# (readers never block the writer) and keep a statement cache, so repeated
+# queries skip both the connect and the SQL compile step.
+import sqlite3
+import threading
+import weakref
+
+CACHED_STATEMENTS = 256       # prepared statements kept per connection
+CACHE_SIZE_KB = 8192          # page cache per connection
+BUSY_TIMEOUT = 10             # seconds to wait on a locked database
+MAX_IDLE = 8                  # idle connections kept per database file
+
+_local = threading.local()
+_idle = {}                    # db_file -> [connection]
+_holders = weakref.WeakSet()  # live threads' connection sets, for close_all
+_lock = threading.Lock()
+
+
+class _ThreadConnections:
+    """One thread's checked-out connections; returned to the pool when the
+    thread's locals are cleared at thread exit."""
+
+    def __init__(self):
+        self.conns = {}
+        weakref.finalize(self, _release, self.conns)
+
+
+def _open(db_file):
+    conn = sqlite3.connect(
+        db_file,
+        timeout=BUSY_TIMEOUT,
+        cached_statements=CACHED_STATEMENTS,
+        # handed from thread to thread through the pool, never shared
+        check_same_thread=False,
+    )
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB};")
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    return conn
+
+
+def _release(conns):
+    for db_file, conn in conns.items():
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            continue
+        with _lock:
+            idle = _idle.setdefault(db_file, [])
+            if len(idle) < MAX_IDLE:
+                idle.append(conn)
+                conn = None
+        if conn is not None:
+            conn.close()
+    conns.clear()
+
+
+def get_connection(db_file):
+    """Return this thread's connection to db_file, checking one out on first use.
+
+    Use `with get_connection(DB_FILE) as conn:` for writes; the context
+    manager commits (or rolls back) but leaves the connection open.
+    """
+    holder = getattr(_local, "holder", None)
+    if holder is None:
+        holder = _local.holder = _ThreadConnections()
+        with _lock:
+            _holders.add(holder)
+
+    conn = holder.conns.get(db_file)
+    if conn is None:
+        with _lock:
+            idle = _idle.get(db_file)
+            conn = idle.pop() if idle else None
+        if conn is None:
+            conn = _open(db_file)
+        holder.conns[db_file] = conn
+    return conn
+
+
+def stats():
+    """Idle connections per database and threads currently holding some."""
+    with _lock:
+        return {"idle": {db: len(conns) for db, conns in _idle.items()},
+                "threads": len(_holders)}
+
+
+def close_all():
+    """Close every pooled connection (all threads). Used on shutdown."""
+    with _lock:
+        conns = [c for idle in _idle.values() for c in idle]
+        _idle.clear()
+        for holder in list(_holders):
+            conns.extend(holder.conns.values())
+            holder.conns.clear()
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.ProgrammingError:
+            pass
@@ -1,10 +1,53 @@
+# event_store.py
+# Recent scan events for the live dashboard (/stream_events).
+#
+# The watcher service and the web app are separate processes, so events go
+# through a small ring table in EVENTS_DB (SQLite, WAL): add_event inserts a
+# row from any process, and in each process that reads events one poller
+# thread picks up new rows and wakes the waiting SSE clients. Clients only
+# ever wait on the in-memory condition, so many dashboards cost one cheap
+# poll per process, not one query per client.
+import json
+import threading
 from collections import deque
 from datetime import datetime
 
+from db_pool import get_connection
+
+EVENTS_DB = "events.db"
+RETENTION = 1000              # rows kept in the ring table
+TRIM_EVERY = 100              # inserts between trims
+POLL_INTERVAL = 0.25          # seconds between checks for other processes' events
+
 # Holds latest 200 events
 event_log = deque(maxlen=200)
 
+# Event ids come from the table, so they increase across processes and
+# restarts; SSE clients resume with Last-Event-ID.
+_last_id = 0
+_cond = threading.Condition()
+_ready = False
+_inserts = 0
+_poller = None
+_wake = threading.Event()
+
+
+def init_db():
+    global _ready
+    if _ready:
+        return
+    with get_connection(EVENTS_DB) as conn:
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            data TEXT
+        );
+        """)
+    _ready = True
+
 def add_event(event_type, file_path, hashes=None, vt_result=None):
+    global _inserts
+    init_db()
     event = {
         "timestamp": datetime.now().isoformat(timespec="seconds"),
         "type": event_type,
@@ -12,7 +55,103 @@ def add_event(event_type, file_path, hashes=None, vt_result=None):
         "hashes": hashes,
         "vt_result": vt_result,
     }
-    event_log.append(event)
+    with get_connection(EVENTS_DB) as conn:
+        cur = conn.execute("INSERT INTO events (data) VALUES (?)", (json.dumps(event),))
+        event_id = cur.lastrowid
+        _inserts += 1
+        if _inserts % TRIM_EVERY == 0:
+            conn.execute("DELETE FROM events WHERE id <= ?", (event_id - RETENTION,))
+    _wake.set()
+    return event_id
+
+# -----------------------
+# Reader side
+# -----------------------
+def _load(conn, after_id, limit=None):
+    if limit is None:
+        rows = conn.execute(
+            "SELECT id, data FROM events WHERE id > ? ORDER BY id", (after_id,)
+        ).fetchall()
+    else:
+        rows = conn.execute(
+            "SELECT id, data FROM events WHERE id > ? ORDER BY id DESC LIMIT ?", (after_id, limit)
+        ).fetchall()
+        rows.reverse()
+    events = []
+    for event_id, data in rows:
+        event = json.loads(data)
+        event["id"] = event_id
+        events.append(event)
+    return events
+
+def _publish(events):
+    global _last_id
+    if not events:
+        return
+    with _cond:
+        for event in events:
+            if event["id"] > _last_id:
+                event_log.append(event)
+                _last_id = event["id"]
+        _cond.notify_all()
+
+def _poll():
+    conn = get_connection(EVENTS_DB)
+    version = None
+    while True:
+        _wake.wait(POLL_INTERVAL)
+        _wake.clear()
+        # data_version changes whenever another connection commits, so an
+        # idle table costs a pragma, not a query
+        current = conn.execute("PRAGMA data_version").fetchone()[0]
+        if current == version and not _wake.is_set():
+            continue
+        version = current
+        try:
+            _publish(_load(conn, _last_id))
+        except Exception as e:
+            print(f"[Events] Poll failed: {e}")
+
+def _ensure_poller():
+    global _poller
+    if _poller is not None:
+        return
+    with _cond:
+        if _poller is not None:
+            return
+        init_db()
+        _publish(_load(get_connection(EVENTS_DB), 0, limit=event_log.maxlen))
+        _poller = threading.Thread(target=_poll, name="event-poller", daemon=True)
+        _poller.start()
 
 def get_events():
-    return list(event_log)
\ No newline at end of file
+    _ensure_poller()
+    with _cond:
+        return list(event_log)
+
+def latest_id():
+    _ensure_poller()
+    with _cond:
+        return _last_id
+
+def _since(last_id):
+    # newest events are at the right; walk back only as far as needed
+    new = []
+    for event in reversed(event_log):
+        if event["id"] <= last_id:
+            break
+        new.append(event)
+    new.reverse()
+    return new
+
+def events_since(last_id):
+    _ensure_poller()
+    with _cond:
+        return _since(last_id)
+
+def wait_for_events(last_id, timeout=None):
+    """Block until there are events newer than last_id (or timeout); return them."""
+    _ensure_poller()
+    with _cond:
+        _cond.wait_for(lambda: _last_id > last_id, timeout)
+        return _since(last_id)
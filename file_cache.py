@@ -0,0 +1,175 @@
+# file_cache.py
+# Persistent file-identity -> hashes cache, so rescans of unchanged files
+# cost a stat() instead of a full read.
+#
+# Entries are keyed by (device, inode) and only trusted while the file's
+# size, mtime_ns and ctime_ns still match what was recorded; renames and
+# moves within a filesystem keep their entry. Any mismatch invalidates the
+# entry. ctime is part of the identity because os.utime can put an mtime
+# back after a same-size rewrite, but nothing can set ctime.
+import json
+import os
+import threading
+import time
+
+from db_pool import get_connection
+from config import HASH_ALGORITHMS
+
+DB_FILE = "hash_cache.db"
+
+MAX_ENTRIES = 500000          # LRU-ish cap, enforced every PRUNE_EVERY inserts
+PRUNE_EVERY = 1000
+TOUCH_INTERVAL = 3600         # refresh last_used at most this often per entry
+
+_lock = threading.Lock()
+_ready = False
+_inserts = 0
+_stats = {"hits": 0, "misses": 0, "invalidated": 0, "stored": 0, "evicted": 0}
+
+
+def init_db():
+    global _ready
+    if _ready:
+        return
+    with get_connection(DB_FILE) as conn:
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS file_hashes (
+            dev INTEGER,
+            inode INTEGER,
+            size INTEGER,
+            mtime_ns INTEGER,
+            ctime_ns INTEGER,
+            hashes TEXT,
+            last_used REAL,
+            PRIMARY KEY (dev, inode)
+        );
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_file_hashes_used ON file_hashes (last_used);")
+        columns = [r[1] for r in conn.execute("PRAGMA table_info(file_hashes)")]
+        if "ctime_ns" not in columns:
+            # entries from before ctime was recorded never match, and are rehashed
+            conn.execute("ALTER TABLE file_hashes ADD COLUMN ctime_ns INTEGER;")
+    _ready = True
+
+
+def _count(name, n=1):
+    with _lock:
+        _stats[name] += n
+
+
+def lookup(st, algorithms=None):
+    """Cached hashes for an os.stat_result, or None."""
+    init_db()
+    wanted = set(HASH_ALGORITHMS if algorithms is None else algorithms) | {"md5", "sha256"}
+    conn = get_connection(DB_FILE)
+    row = conn.execute(
+        "SELECT size, mtime_ns, ctime_ns, hashes, last_used FROM file_hashes WHERE dev=? AND inode=?",
+        (st.st_dev, st.st_ino),
+    ).fetchone()
+    if row is None:
+        _count("misses")
+        return None
+
+    size, mtime_ns, ctime_ns, hashes_json, last_used = row
+    if size != st.st_size or mtime_ns != st.st_mtime_ns or ctime_ns != st.st_ctime_ns:
+        with conn:
+            conn.execute("DELETE FROM file_hashes WHERE dev=? AND inode=?", (st.st_dev, st.st_ino))
+        _count("invalidated")
+        _count("misses")
+        return None
+
+    hashes = json.loads(hashes_json)
+    if not wanted.issubset(hashes):
+        # cached before more algorithms were configured
+        _count("misses")
+        return None
+
+    now = time.time()
+    if now - (last_used or 0) > TOUCH_INTERVAL:
+        with conn:
+            conn.execute("UPDATE file_hashes SET last_used=? WHERE dev=? AND inode=?",
+                         (now, st.st_dev, st.st_ino))
+    _count("hits")
+    return hashes
+
+
+def lookup_path(path, algorithms=None):
+    try:
+        return lookup(os.stat(path), algorithms)
+    except OSError:
+        return None
+
+
+def store(st, hashes):
+    global _inserts
+    init_db()
+    with get_connection(DB_FILE) as conn:
+        conn.execute("""
+            INSERT INTO file_hashes (dev, inode, size, mtime_ns, ctime_ns, hashes, last_used)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(dev, inode) DO UPDATE SET size=excluded.size, mtime_ns=excluded.mtime_ns,
+                ctime_ns=excluded.ctime_ns, hashes=excluded.hashes, last_used=excluded.last_used
+        """, (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns,
+              json.dumps(hashes), time.time()))
+    _count("stored")
+
+    with _lock:
+        _inserts += 1
+        due = _inserts % PRUNE_EVERY == 0
+    if due:
+        prune()
+
+
+def prune(max_entries=MAX_ENTRIES):
+    """Evict least recently used entries beyond max_entries."""
+    with get_connection(DB_FILE) as conn:
+        count = conn.execute("SELECT COUNT(*) FROM file_hashes").fetchone()[0]
+        excess = count - max_entries
+        if excess > 0:
+            conn.execute("""
+                DELETE FROM file_hashes WHERE rowid IN (
+                    SELECT rowid FROM file_hashes ORDER BY last_used LIMIT ?
+                )
+            """, (excess,))
+            _count("evicted", excess)
+
+
+def forget(path):
+    """Drop the entry for a path (e.g. on a delete event)."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return
+    init_db()
+    with get_connection(DB_FILE) as conn:
+        conn.execute("DELETE FROM file_hashes WHERE dev=? AND inode=?", (st.st_dev, st.st_ino))
+
+
+def cached_hashes(path, compute, algorithms=None):
+    """Return hashes for path from the cache, or compute(path) and remember them.
+
+    The result is only stored if the file did not change while it was hashed.
+    """
+    try:
+        before = os.stat(path)
+    except OSError:
+        return compute(path)
+
+    hit = lookup(before, algorithms)
+    if hit is not None:
+        return hit
+
+    hashes = compute(path)
+    try:
+        after = os.stat(path)
+    except OSError:
+        return hashes
+    if (after.st_dev, after.st_ino, after.st_size, after.st_mtime_ns, after.st_ctime_ns) == \
+            (before.st_dev, before.st_ino, before.st_size, before.st_mtime_ns, before.st_ctime_ns):
+        store(after, hashes)
+    return hashes
+
+
+def stats():
+    with _lock:
+        return dict(_stats)
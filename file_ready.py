@@ -0,0 +1,204 @@
+# file_ready.py
+# Decides when a new file is complete enough to scan, driven by filesystem
+# events instead of polling its size:
+#   - close-after-write (inotify IN_CLOSE_WRITE) makes a file ready at once,
+#   - a file renamed into place (browsers/downloaders) is ready at once,
+#   - otherwise a file is ready after `quiet` seconds without events
+#     (debounce), and is scanned anyway once it exceeds the `max_wait` budget.
+# All pending files share one timer thread, so thousands of concurrent
+# writes cost heap entries, not threads.
+import heapq
+import itertools
+import os
+import threading
+import time
+
+from config import READY_QUIET, READY_QUIET_WITH_CLOSE, READY_MAX_WAIT, READY_IGNORE_SUFFIXES
+
+
+def supports_close_events():
+    """True if the platform observer reports close-after-write (Linux inotify)."""
+    from watchdog.observers import Observer
+    return Observer.__name__ == "InotifyObserver"
+
+
+class _Pending:
+    __slots__ = ("first_seen", "last_event")
+
+    def __init__(self, now):
+        self.first_seen = now
+        self.last_event = now
+
+
+class ReadinessTracker:
+    def __init__(self, on_ready, quiet=None, max_wait=READY_MAX_WAIT,
+                 ignore_suffixes=READY_IGNORE_SUFFIXES):
+        """on_ready(path) is called once per file that became ready; if it
+        returns False the file is offered again after another quiet period."""
+        if quiet is None:
+            quiet = READY_QUIET_WITH_CLOSE if supports_close_events() else READY_QUIET
+        self.on_ready = on_ready
+        self.quiet = quiet
+        self.max_wait = max_wait
+        self.ignore_suffixes = tuple(s.lower() for s in ignore_suffixes)
+        self._pending = {}            # path -> _Pending
+        self._heap = []               # (deadline, seq, path, _Pending); stale entries are skipped
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+        self.stats = {"closed": 0, "moved": 0, "quiet": 0, "budget": 0,
+                      "gave_up": 0, "cancelled": 0, "requeued": 0}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="file-ready", daemon=True)
+        self._thread.start()
+        return self
+
+    def ignored(self, path):
+        return path.lower().endswith(self.ignore_suffixes)
+
+    # -----------------------
+    # Event entry points (called from observer threads)
+    # -----------------------
+    def touch(self, path, create=True):
+        """A file was created (or, create=False, written to); (re)start its
+        quiet period. Writes to files that are not pending are ignored, so
+        only new files are scanned, as before."""
+        if self.ignored(path):
+            return
+        now = time.monotonic()
+        with self._cond:
+            p = self._pending.get(path)
+            if p is not None:
+                # the timer re-arms lazily from last_event, no heap push per write
+                p.last_event = now
+                return
+            if not create:
+                return
+            p = self._pending[path] = _Pending(now)
+            self._push(now + self.quiet, path, p)
+
+    def closed(self, path):
+        """The writer of a pending file closed it: it is ready now."""
+        with self._cond:
+            if self._pending.pop(path, None) is None:
+                return
+        self._ready(path, "closed")
+
+    def moved(self, src_path, dest_path):
+        """A file was renamed; the destination is complete unless it is a temp name."""
+        self.cancel(src_path)
+        if self.ignored(dest_path):
+            return
+        with self._cond:
+            self._pending.pop(dest_path, None)
+        self._ready(dest_path, "moved")
+
+    def cancel(self, path):
+        with self._cond:
+            if self._pending.pop(path, None) is not None:
+                self.stats["cancelled"] += 1
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending)
+
+    # -----------------------
+    # Timer thread
+    # -----------------------
+    def _push(self, deadline, path, p):
+        heapq.heappush(self._heap, (deadline, next(self._seq), path, p))
+        self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    if self._heap:
+                        wait = self._heap[0][0] - time.monotonic()
+                        if wait <= 0:
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+                if self._stopped:
+                    return
+                _, _, path, p = heapq.heappop(self._heap)
+                if self._pending.get(path) is not p:
+                    continue          # already handled by close/move/cancel
+
+                now = time.monotonic()
+                budget_end = p.first_seen + self.max_wait
+                due = p.last_event + self.quiet
+                if due > now and now < budget_end:
+                    # written to since the timer was armed
+                    self._push(min(due, budget_end), path, p)
+                    continue
+                over_budget = now >= budget_end
+
+            reason = self._check(path, over_budget)
+            with self._cond:
+                if self._pending.get(path) is not p:
+                    continue
+                if reason is None:
+                    self._push(time.monotonic() + self.quiet, path, p)
+                    continue
+                del self._pending[path]
+            if reason != "gave_up":
+                self._ready(path, reason)
+
+    def _check(self, path, over_budget):
+        """Outcome for a file whose quiet period (or budget) ran out, or None to retry."""
+        try:
+            with open(path, "rb"):
+                pass
+        except FileNotFoundError:
+            with self._cond:
+                self.stats["cancelled"] += 1
+            return "gave_up"
+        except PermissionError:
+            # still locked by its writer (Windows)
+            if over_budget:
+                print(f"[Ready] Gave up on {path}: still locked after {self.max_wait:.0f}s")
+                with self._cond:
+                    self.stats["gave_up"] += 1
+                return "gave_up"
+            return None
+        if over_budget:
+            print(f"[Ready] {path} still changing after {self.max_wait:.0f}s; scanning current contents")
+            return "budget"
+        return "quiet"
+
+    def _ready(self, path, reason):
+        if not os.path.isfile(path):
+            return
+        with self._cond:
+            self.stats[reason] += 1
+        try:
+            accepted = self.on_ready(path)
+        except Exception as e:
+            print(f"[Ready] Failed to hand off {path}: {e}")
+            accepted = False
+        if accepted is False:
+            # e.g. the scan queue stayed full: try again after another quiet period
+            with self._cond:
+                if self._stopped or path in self._pending:
+                    return
+                now = time.monotonic()
+                p = self._pending[path] = _Pending(now)
+                self._push(now + self.quiet, path, p)
+                self.stats["requeued"] += 1
+
+    def stop(self, flush=False):
+        """Stop the timer; with flush=True hand off every pending file now."""
+        with self._cond:
+            self._stopped = True
+            leftover = list(self._pending) if flush else []
+            self._pending.clear()
+            self._heap.clear()
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        for path in leftover:
+            self._ready(path, "quiet")
@@ -0,0 +1,155 @@
+# hash_lookup.py
+# Coalesces sha256 verdict lookups from many threads (watchers, bursts of
+# new files) into batches:
+#   1. requests arriving within WINDOW are collected and deduplicated,
+#   2. the batch is checked against local_db and history_db in bulk,
+#   3. only the remaining unknowns go to VirusTotal, under its quota.
+# A hash already waiting on VT is never sent twice; later callers just
+# attach to the pending lookup.
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import history_db
+import local_db
+import reports
+from ratelimit import PRIORITY_BACKGROUND
+from vt import get_client, normalize_file_report
+
+WINDOW = 0.1              # seconds to collect a batch after the first request
+MAX_BATCH = 1000          # flush early once this many distinct hashes are waiting
+VT_WORKERS = 4            # concurrent VT requests (the token bucket sets the pace)
+LOCAL_CONSENSUS = 3       # VT detections needed to add a hash to local_db
+
+
+class LookupCoalescer:
+    def __init__(self, window=WINDOW, max_batch=MAX_BATCH, vt_workers=VT_WORKERS,
+                 priority=PRIORITY_BACKGROUND, client=None):
+        self.window = window
+        self.max_batch = max_batch
+        self.priority = priority
+        self.client = client
+        self._pending = {}        # sha256 -> [Future], not yet batched
+        self._inflight = {}       # sha256 -> [Future], waiting on VT
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=vt_workers, thread_name_prefix="vt-hash")
+        self.stats = {"requests": 0, "coalesced": 0, "batches": 0, "largest_batch": 0,
+                      "local_hits": 0, "history_hits": 0, "vt_lookups": 0, "vt_errors": 0}
+        self._thread = threading.Thread(target=self._run, name="hash-lookup", daemon=True)
+        self._thread.start()
+
+    def lookup(self, sha256):
+        """Future resolving to {"counts": ..., "engines": ...} for sha256,
+        or {} when VT could not be asked."""
+        sha256 = sha256.lower()
+        future = Future()
+        with self._cond:
+            self.stats["requests"] += 1
+            if sha256 in self._inflight:
+                self._inflight[sha256].append(future)
+                self.stats["coalesced"] += 1
+                return future
+            waiters = self._pending.setdefault(sha256, [])
+            if waiters:
+                self.stats["coalesced"] += 1
+            waiters.append(future)
+            self._cond.notify()
+        return future
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending = self._pending, {}
+                self.stats["batches"] += 1
+                self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
+            try:
+                self._resolve_batch(batch)
+            except Exception as e:
+                print(f"[HashLookup] Batch failed: {e}")
+                for futures in batch.values():
+                    _set_result(futures, {})
+
+    def _resolve_batch(self, batch):
+        hashes = list(batch)
+
+        malicious = local_db.filter_malicious(hashes)
+        for sha256 in malicious:
+            _set_result(batch[sha256], local_db.local_verdict())
+        self.stats["local_hits"] += len(malicious)
+
+        rest = [h for h in hashes if h not in malicious]
+        cached = history_db.get_cached_results(rest, "sha256")
+        for sha256, entry in cached.items():
+            _set_result(batch[sha256], entry["result"])
+        self.stats["history_hits"] += len(cached)
+
+        unknown = [h for h in rest if h not in cached]
+        with self._cond:
+            for sha256 in unknown:
+                # a lookup may have been started for it by an earlier batch
+                if sha256 in self._inflight:
+                    self._inflight[sha256].extend(batch[sha256])
+                    continue
+                self._inflight[sha256] = list(batch[sha256])
+                self._executor.submit(self._lookup_vt, sha256)
+
+    def _lookup_vt(self, sha256):
+        normalized = {}
+        try:
+            client = self.client or get_client()
+            raw = client.get_file_report(sha256, self.priority)
+            with self._cond:
+                self.stats["vt_lookups"] += 1
+                if raw is None:
+                    self.stats["vt_errors"] += 1
+            if raw is None:
+                # nothing is cached, so the next lookup asks VT again
+                return
+            normalized = normalize_file_report(raw)
+            history_db.add_or_update_cache(sha256, "sha256", normalized)
+            if normalized["engines"]:
+                reports.schedule(sha256, "sha256")
+            if normalized["counts"].get("malicious", 0) >= LOCAL_CONSENSUS:
+                local_db.add_malicious_hash(sha256)
+        except Exception as e:
+            print(f"[HashLookup] VT lookup for {sha256} failed: {e}")
+        finally:
+            with self._cond:
+                futures = self._inflight.pop(sha256, [])
+            _set_result(futures, normalized)
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending) + len(self._inflight)
+
+
+def _set_result(futures, result):
+    for f in futures:
+        if not f.done():
+            f.set_result(result)
+
+
+_coalescers = {}          # priority -> LookupCoalescer
+_coalescer_lock = threading.Lock()
+
+def get_coalescer(priority=PRIORITY_BACKGROUND):
+    """The shared coalescer whose VT calls run at priority."""
+    coalescer = _coalescers.get(priority)
+    if coalescer is None:
+        with _coalescer_lock:
+            coalescer = _coalescers.get(priority)
+            if coalescer is None:
+                coalescer = _coalescers[priority] = LookupCoalescer(priority=priority)
+    return coalescer
+
+def lookup_hash(sha256, timeout=None):
+    """Blocking verdict lookup through the shared coalescer."""
+    return get_coalescer().lookup(sha256).result(timeout)
@@ -1,15 +1,140 @@
 import hashlib
+import mmap
+import os
+import threading
 
-def compute_hashes(file_path):
-    md5 = hashlib.md5()
-    sha = hashlib.sha256()
+from config import HASH_ALGORITHMS
 
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            md5.update(chunk)
-            sha.update(chunk)
+BUFFER_SIZE = 1024 * 1024               # read size; hashlib drops the GIL for large updates
+MMAP_THRESHOLD = 16 * 1024 * 1024       # files at least this big are mapped instead of read
+MMAP_CHUNK = 8 * 1024 * 1024            # slice size fed to each digest from a mapped file
 
-    return {
-        "md5": md5.hexdigest(),
-        "sha256": sha.hexdigest()
-    }
\ No newline at end of file
+REQUIRED_ALGORITHMS = ("md5", "sha256")
+
+try:
+    import ssdeep   # optional: pip install ssdeep
+except ImportError:
+    ssdeep = None
+
+_local = threading.local()
+_warned = set()
+
+
+def _buffer():
+    # one reusable read buffer per thread
+    buf = getattr(_local, "buf", None)
+    if buf is None:
+        buf = _local.buf = bytearray(BUFFER_SIZE)
+    return buf
+
+
+class _FuzzyHash:
+    """Adapter giving ssdeep's streaming hash the hashlib interface."""
+
+    def __init__(self):
+        self._h = ssdeep.Hash()
+
+    def update(self, data):
+        self._h.update(bytes(data))
+
+    def hexdigest(self):
+        return self._h.digest()
+
+
+def _new_digests(algorithms):
+    digests = {}
+    for name in dict.fromkeys(REQUIRED_ALGORITHMS + tuple(algorithms)):
+        if name == "ssdeep":
+            if ssdeep is None:
+                if name not in _warned:
+                    _warned.add(name)
+                    print("[Hashing] ssdeep requested but the ssdeep package is not installed; skipping")
+                continue
+            digests[name] = _FuzzyHash()
+        else:
+            try:
+                digests[name] = hashlib.new(name)
+            except ValueError:
+                if name not in _warned:
+                    _warned.add(name)
+                    print(f"[Hashing] Unknown hash algorithm {name!r}; skipping")
+    return digests
+
+
+def _hash_read(f, updates):
+    buf = _buffer()
+    view = memoryview(buf)
+    while True:
+        n = f.readinto(buf)
+        if not n:
+            break
+        chunk = view[:n]
+        for update in updates:
+            update(chunk)
+
+
+def _feed(view, size, update):
+    for start in range(0, size, MMAP_CHUNK):
+        with view[start:start + MMAP_CHUNK] as chunk:
+            update(chunk)
+
+
+def _hash_mmap(f, size, updates):
+    # The whole file is addressable, so each digest walks it on its own
+    # thread; hashlib releases the GIL while it works on large buffers,
+    # which lets md5/sha256/... run on separate cores.
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        with memoryview(mm) as view:
+            threads = [
+                threading.Thread(target=_feed, args=(view, size, update))
+                for update in updates[1:]
+            ]
+            for t in threads:
+                t.start()
+            try:
+                _feed(view, size, updates[0])
+            finally:
+                for t in threads:
+                    t.join()
+
+
+def compute_hashes(file_path, algorithms=None):
+    """Hash a file in one pass with every configured digest.
+
+    md5 and sha256 are always computed; algorithms (default HASH_ALGORITHMS
+    from settings) may add e.g. "sha1" or "ssdeep". Large files are mapped
+    with mmap and digested in parallel, others are read into a reused buffer.
+    """
+    digests = _new_digests(HASH_ALGORITHMS if algorithms is None else algorithms)
+    updates = [d.update for d in digests.values()]
+
+    with open(file_path, "rb", buffering=0) as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            try:
+                _hash_mmap(f, size, updates)
+            except (OSError, ValueError):
+                # e.g. file truncated while mapping; start over with plain reads
+                digests = _new_digests(HASH_ALGORITHMS if algorithms is None else algorithms)
+                updates = [d.update for d in digests.values()]
+                f.seek(0)
+                _hash_read(f, updates)
+        else:
+            _hash_read(f, updates)
+
+    return {name: d.hexdigest() for name, d in digests.items()}
+
+
+class StreamHasher:
+    """compute_hashes for data that arrives in chunks (e.g. an upload)."""
+
+    def __init__(self, algorithms=None):
+        self._digests = _new_digests(HASH_ALGORITHMS if algorithms is None else algorithms)
+        self._updates = [d.update for d in self._digests.values()]
+
+    def update(self, data):
+        for update in self._updates:
+            update(data)
+
+    def hexdigests(self):
+        return {name: d.hexdigest() for name, d in self._digests.items()}
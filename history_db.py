@@ -1,62 +1,412 @@
 # history_db.py
-import sqlite3
 import os
 import json
-from datetime import datetime, timedelta
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from db_pool import get_connection
 
 DB_FILE = "scan_history.db"
 
+# -----------------------
+# Freshness / in-process cache
+# -----------------------
+CACHE_MAX_ENTRIES = 10000
+TTL_SECONDS = {
+    "url": 24 * 3600,           # URL verdicts change quickly
+    "sha256": 30 * 24 * 3600,   # file verdicts are stable
+}
+DEFAULT_TTL = 24 * 3600
+NEGATIVE_TTL = 3600             # "VT has no record" results (empty engine table)
+PURGE_INTERVAL = 3600           # seconds between background purges
+
+_cache = OrderedDict()          # (key, key_type) -> (expires_at, entry)
+_cache_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "purged_rows": 0}
+_purge_thread = None
+
+# -----------------------
+# Schema
+# -----------------------
+# v0 stored each verdict as one result_json blob. v1 keeps the counts in
+# typed columns and the engine table packed (see _pack_engines), so list
+# views and purges never decode engine tables.
+SCHEMA_VERSION = 1
+COUNT_COLUMNS = ("malicious", "suspicious", "clean", "harmless")
+PACK_LEVEL = 6                  # zlib level for packed engine tables
+MIGRATION_WAIT = 3600           # seconds to wait for another process's migration
+
+_SCHEMA_V1 = """
+CREATE TABLE IF NOT EXISTS scan_history (
+    key TEXT PRIMARY KEY,        -- sha256 or URL
+    key_type TEXT,               -- 'sha256' or 'url'
+    malicious INTEGER NOT NULL DEFAULT 0,
+    suspicious INTEGER NOT NULL DEFAULT 0,
+    clean INTEGER NOT NULL DEFAULT 0,
+    harmless INTEGER NOT NULL DEFAULT 0,
+    engine_count INTEGER NOT NULL DEFAULT 0,
+    engines BLOB,                -- packed engine table, NULL when empty
+    extra TEXT,                  -- any other top-level result fields, as JSON
+    last_scanned TEXT
+);
+"""
+
 def init_db():
     os.makedirs(os.path.dirname(DB_FILE) or ".", exist_ok=True)
-    conn = sqlite3.connect(DB_FILE)
-    cur = conn.cursor()
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS scan_history (
-        key TEXT PRIMARY KEY,        -- sha256 or URL
-        key_type TEXT,               -- 'sha256' or 'url'
-        result_json TEXT,
-        last_scanned TEXT
-    );
+    conn = get_connection(DB_FILE)
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+    # IMMEDIATE: the app and the watcher may both start at once
+    _begin_migration(conn)
+    migrate = False
+    try:
+        if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            columns = [r[1] for r in conn.execute("PRAGMA table_info(scan_history)")]
+            migrate = "result_json" in columns
+            if migrate:
+                conn.execute("ALTER TABLE scan_history RENAME TO scan_history_v0")
+            conn.execute(_SCHEMA_V1)
+            if migrate:
+                _migrate_v0(conn)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_history_last_scanned ON scan_history (last_scanned);")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_history_type_scanned ON scan_history (key_type, last_scanned);")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_history_negative ON scan_history (last_scanned) "
+                         "WHERE engine_count = 0;")
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        if migrate:
+            # give back the space of the v0 blobs (in WAL mode VACUUM goes
+            # through the log, so truncate that too)
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+def _begin_migration(conn):
+    # a migration of a large history holds the write lock for minutes, far
+    # past the pool's busy timeout; keep waiting until it commits
+    deadline = time.monotonic() + MIGRATION_WAIT
+    waiting = False
+    while True:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            return
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) or time.monotonic() >= deadline:
+                raise
+            if not waiting:
+                waiting = True
+                print("[History] Waiting for another process to finish migrating the scan history")
+
+def _migrate_v0(conn):
+    start = time.perf_counter()
+    conn.create_function("pack_result", 1, _pack_result_json, deterministic=True)
+    conn.execute(f"""
+        INSERT INTO scan_history (key, key_type, {', '.join(COUNT_COLUMNS)},
+                                  engine_count, engines, extra, last_scanned)
+        SELECT key, key_type,
+               {', '.join(f"COALESCE(json_extract(result_json, '$.counts.{c}'), 0)" for c in COUNT_COLUMNS)},
+               (SELECT COUNT(*) FROM json_each(result_json, '$.engines')),
+               pack_result(result_json),
+               NULLIF(json_remove(result_json, '$.counts', '$.engines'), '{{}}'),
+               last_scanned
+        FROM scan_history_v0
+        WHERE json_valid(result_json)
     """)
-    conn.commit()
-    conn.close()
+    conn.execute("DROP TABLE scan_history_v0")
+    rows = conn.execute("SELECT COUNT(*) FROM scan_history").fetchone()[0]
+    print(f"[History] Migrated {rows} rows to schema v{SCHEMA_VERSION} in {time.perf_counter() - start:.1f}s")
+
+# -----------------------
+# Packing
+# -----------------------
+def _pack_engines(engines):
+    """Engine table -> zlib'd JSON list. Entries in the usual
+    {"result": r, "engine_name": name} shape shrink to [name, r]."""
+    if not engines:
+        return None
+    items = []
+    for name, info in engines.items():
+        if (isinstance(info, dict) and len(info) == 2 and info.get("engine_name") == name
+                and isinstance(info.get("result"), str)):
+            items.append([name, info["result"]])
+        else:
+            items.append([name, info])
+    return zlib.compress(json.dumps(items, separators=(",", ":")).encode(), PACK_LEVEL)
+
+def _unpack_engines(blob):
+    if not blob:
+        return {}
+    engines = {}
+    for name, info in json.loads(zlib.decompress(blob)):
+        engines[name] = {"result": info, "engine_name": name} if isinstance(info, str) else info
+    return engines
+
+def _pack_result_json(result_json):
+    # SQL function for the v0 migration
+    return _pack_engines(json.loads(result_json).get("engines"))
+
+def _columns(result_obj):
+    """Column values (counts..., engine_count, engines, extra) for a result."""
+    result_obj = result_obj or {}
+    counts = result_obj.get("counts") or {}
+    engines = result_obj.get("engines") or {}
+    extra = {k: v for k, v in result_obj.items() if k not in ("counts", "engines")}
+    return (
+        *(int(counts.get(c) or 0) for c in COUNT_COLUMNS),
+        len(engines),
+        _pack_engines(engines),
+        json.dumps(extra) if extra else None,
+    )
+
+_RESULT_COLUMNS = f"{', '.join(COUNT_COLUMNS)}, engines, extra"
+
+def _result(row):
+    """Rebuild the result object from the columns in _RESULT_COLUMNS order."""
+    counts = dict(zip(COUNT_COLUMNS, row[:4]))
+    result = json.loads(row[5]) if row[5] else {}
+    result.update(counts=counts, engines=_unpack_engines(row[4]))
+    return result
+
+def _is_negative(result_obj):
+    return not (result_obj or {}).get("engines")
+
+def _ttl_for(key_type, result_obj):
+    if _is_negative(result_obj):
+        return NEGATIVE_TTL
+    return TTL_SECONDS.get(key_type, DEFAULT_TTL)
+
+def _expires_at(last_scanned, ttl):
+    try:
+        scanned = datetime.fromisoformat(last_scanned).replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return 0.0
+    return scanned.timestamp() + ttl
+
+def _cache_put(cache_key, expires_at, entry):
+    with _cache_lock:
+        _cache[cache_key] = (expires_at, entry)
+        _cache.move_to_end(cache_key)
+        while len(_cache) > CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+            _stats["evictions"] += 1
 
 def get_cached_result(key, key_type):
-    conn = sqlite3.connect(DB_FILE)
-    cur = conn.cursor()
-    cur.execute("SELECT result_json, last_scanned FROM scan_history WHERE key=? AND key_type=?", (key, key_type))
-    row = cur.fetchone()
-    conn.close()
+    """Return {"result", "last_scanned"} if a fresh verdict exists, else None."""
+    cache_key = (key, key_type)
+    now = time.time()
+
+    with _cache_lock:
+        cached = _cache.get(cache_key)
+        if cached is not None:
+            expires_at, entry = cached
+            if expires_at > now:
+                _cache.move_to_end(cache_key)
+                _stats["hits"] += 1
+                return entry
+            del _cache[cache_key]
+            _stats["expired"] += 1
+        _stats["misses"] += 1
+
+    conn = get_connection(DB_FILE)
+    row = conn.execute(
+        f"SELECT {_RESULT_COLUMNS}, last_scanned FROM scan_history WHERE key=? AND key_type=?",
+        (key, key_type),
+    ).fetchone()
     if not row:
         return None
     try:
-        return {"result": json.loads(row[0]), "last_scanned": row[1]}
+        entry = {"result": _result(row), "last_scanned": row[6]}
     except Exception:
         return None
 
+    expires_at = _expires_at(row[6], _ttl_for(key_type, entry["result"]))
+    if expires_at <= now:
+        return None
+    _cache_put(cache_key, expires_at, entry)
+    return entry
+
+def get_cached_results(keys, key_type, chunk_size=500):
+    """Bulk get_cached_result: {key: entry} for every key with a fresh verdict.
+
+    Keys missing from the LRU are fetched with one IN (...) query per chunk.
+    """
+    found = {}
+    missing = []
+    now = time.time()
+
+    with _cache_lock:
+        for key in dict.fromkeys(keys):
+            cached = _cache.get((key, key_type))
+            if cached is not None and cached[0] > now:
+                _cache.move_to_end((key, key_type))
+                _stats["hits"] += 1
+                found[key] = cached[1]
+            else:
+                if cached is not None:
+                    del _cache[(key, key_type)]
+                    _stats["expired"] += 1
+                _stats["misses"] += 1
+                missing.append(key)
+
+    conn = get_connection(DB_FILE)
+    for i in range(0, len(missing), chunk_size):
+        chunk = missing[i:i + chunk_size]
+        rows = conn.execute(
+            f"SELECT {_RESULT_COLUMNS}, last_scanned, key FROM scan_history "
+            f"WHERE key_type=? AND key IN ({','.join('?' * len(chunk))})",
+            [key_type] + chunk,
+        ).fetchall()
+        for row in rows:
+            last_scanned, key = row[6], row[7]
+            try:
+                entry = {"result": _result(row), "last_scanned": last_scanned}
+            except Exception:
+                continue
+            expires_at = _expires_at(last_scanned, _ttl_for(key_type, entry["result"]))
+            if expires_at <= now:
+                continue
+            _cache_put((key, key_type), expires_at, entry)
+            found[key] = entry
+    return found
+
 def add_or_update_cache(key, key_type, result_obj):
-    conn = sqlite3.connect(DB_FILE)
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO scan_history (key, key_type, result_json, last_scanned)
-        VALUES (?, ?, ?, ?)
-        ON CONFLICT(key) DO UPDATE SET result_json=excluded.result_json, last_scanned=excluded.last_scanned
-    """, (key, key_type, json.dumps(result_obj), datetime.utcnow().isoformat()))
-    conn.commit()
-    conn.close()
+    last_scanned = datetime.utcnow().isoformat()
+    with get_connection(DB_FILE) as conn:
+        conn.execute(f"""
+            INSERT INTO scan_history (key, key_type, {', '.join(COUNT_COLUMNS)},
+                                      engine_count, engines, extra, last_scanned)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET key_type=excluded.key_type,
+                {', '.join(f"{c}=excluded.{c}" for c in COUNT_COLUMNS)},
+                engine_count=excluded.engine_count, engines=excluded.engines,
+                extra=excluded.extra, last_scanned=excluded.last_scanned
+        """, (key, key_type, *_columns(result_obj), last_scanned))
+
+    entry = {"result": result_obj, "last_scanned": last_scanned}
+    _cache_put((key, key_type), _expires_at(last_scanned, _ttl_for(key_type, result_obj)), entry)
 
 def purge_older_than(days=30):
     cutoff = (datetime.utcnow() - timedelta(days=days)).isoformat()
-    conn = sqlite3.connect(DB_FILE)
-    cur = conn.cursor()
-    cur.execute("DELETE FROM scan_history WHERE last_scanned < ?", (cutoff,))
-    conn.commit()
-    conn.close()
-    
-def list_all(limit=200):
-    conn = sqlite3.connect(DB_FILE)
-    cur = conn.cursor()
-    cur.execute("SELECT key, key_type, result_json, last_scanned FROM scan_history ORDER BY last_scanned DESC LIMIT ?", (limit,))
-    rows = cur.fetchall()
-    conn.close()
-    return rows
\ No newline at end of file
+    with get_connection(DB_FILE) as conn:
+        conn.execute("DELETE FROM scan_history WHERE last_scanned < ?", (cutoff,))
+    clear_cache()
+
+def purge_expired():
+    """Delete rows whose TTL has passed and drop expired cache entries."""
+    now = datetime.utcnow()
+
+    def cutoff(ttl):
+        return (now - timedelta(seconds=ttl)).isoformat()
+
+    with get_connection(DB_FILE) as conn:
+        deleted = conn.execute(
+            "DELETE FROM scan_history WHERE engine_count = 0 AND last_scanned < ?",
+            (cutoff(NEGATIVE_TTL),),
+        ).rowcount
+        for key_type, ttl in TTL_SECONDS.items():
+            deleted += conn.execute(
+                "DELETE FROM scan_history WHERE key_type=? AND last_scanned < ?",
+                (key_type, cutoff(ttl)),
+            ).rowcount
+
+    now_ts = time.time()
+    with _cache_lock:
+        for cache_key in [k for k, (exp, _) in _cache.items() if exp <= now_ts]:
+            del _cache[cache_key]
+            _stats["expired"] += 1
+        _stats["purged_rows"] += deleted
+    return deleted
+
+def _purge_loop():
+    while True:
+        try:
+            deleted = purge_expired()
+            if deleted:
+                print(f"[History] Purged {deleted} expired rows")
+        except Exception as e:
+            print(f"[History] Purge failed: {e}")
+        time.sleep(PURGE_INTERVAL)
+
+def start_purge_thread():
+    global _purge_thread
+    if _purge_thread is None:
+        _purge_thread = threading.Thread(target=_purge_loop, name="history-purge", daemon=True)
+        _purge_thread.start()
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+def cache_stats():
+    with _cache_lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return dict(
+            _stats,
+            size=len(_cache),
+            max_entries=CACHE_MAX_ENTRIES,
+            hit_ratio=round(_stats["hits"] / lookups, 4) if lookups else 0.0,
+        )
+
+def list_summaries(limit=200, offset=0, key_type=None):
+    """Newest verdicts as {"key", "type", "counts", "engine_count", "date"},
+    read from the typed columns without unpacking engine tables."""
+    where, params = "", []
+    if key_type:
+        where, params = "WHERE key_type=?", [key_type]
+    rows = get_connection(DB_FILE).execute(
+        f"SELECT key, key_type, {', '.join(COUNT_COLUMNS)}, engine_count, last_scanned "
+        f"FROM scan_history {where} ORDER BY last_scanned DESC LIMIT ? OFFSET ?",
+        params + [limit, offset],
+    ).fetchall()
+    return [
+        {"key": row[0], "type": row[1], "counts": dict(zip(COUNT_COLUMNS, row[2:6])),
+         "engine_count": row[6], "date": row[7]}
+        for row in rows
+    ]
+
+def iter_entries(start=None, end=None, keys=None, limit=None, batch=500):
+    """Yield (key, key_type, {"result", "last_scanned"}) for stored verdicts,
+    fresh or not: the given keys, or everything scanned in [start, end)
+    oldest first. Rows are read batch by batch, so exports of any size
+    stay small in memory."""
+    conn = get_connection(DB_FILE)
+    columns = f"key, key_type, {_RESULT_COLUMNS}, last_scanned"
+    produced = 0
+
+    def emit(rows):
+        for row in rows:
+            yield row[0], row[1], {"result": _result(row[2:]), "last_scanned": row[8]}
+
+    if keys is not None:
+        keys = list(dict.fromkeys(keys))
+        for i in range(0, len(keys), batch):
+            chunk = keys[i:i + batch] if limit is None else keys[i:i + min(batch, limit - produced)]
+            if not chunk:
+                return
+            rows = conn.execute(
+                f"SELECT {columns} FROM scan_history WHERE key IN ({','.join('?' * len(chunk))})", chunk,
+            ).fetchall()
+            produced += len(chunk)
+            yield from emit(rows)
+        return
+
+    after = (start or "", "")
+    while limit is None or produced < limit:
+        size = batch if limit is None else min(batch, limit - produced)
+        rows = conn.execute(
+            f"SELECT {columns} FROM scan_history WHERE (last_scanned, key) > (?, ?)"
+            + (" AND last_scanned < ?" if end else "") + " ORDER BY last_scanned, key LIMIT ?",
+            [*after, *([end] if end else []), size],
+        ).fetchall()
+        if not rows:
+            return
+        produced += len(rows)
+        after = (rows[-1][8], rows[-1][0])
+        yield from emit(rows)
@@ -1,43 +1,364 @@
 # local_db.py
-import sqlite3
+import argparse
+import csv
 import os
+import re
+import sqlite3
+import threading
+import time
 from datetime import datetime
 
+from db_pool import get_connection
+from signature_index import SignatureIndex
+import verdict
+
 DB_FILE = "malware_hashes.db"
 
-def init_db():
+RELOAD_CHECK_INTERVAL = 2     # seconds between checks for outside changes to DB_FILE
+INCREMENTAL_MAX = 50000       # new rows caught up in place; more trigger a background rebuild
+
+IMPORT_BATCH_SIZE = 100000        # rows per executemany/transaction
+IMPORT_DROP_INDEX_BYTES = 50 * 1024 * 1024   # feeds larger than this import without secondary indexes
+IMPORT_REPORT_EVERY = 1000000     # progress line every N rows read
+
+SHA256_RE = re.compile(r"^[0-9a-fA-F]{64}$")
+SHA256_COLUMNS = ("sha256", "sha256_hash", "sha256hash", "hash")
+
+_index = None
+_index_rowid = 0              # highest malware_hashes rowid in _index
+_index_stamp = None
+_rebuilding = False
+_last_check = 0.0
+_index_lock = threading.Lock()
+
+def create_tables():
     os.makedirs(os.path.dirname(DB_FILE) or ".", exist_ok=True)
-    conn = sqlite3.connect(DB_FILE)
-    cur = conn.cursor()
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS malware_hashes (
-        sha256 TEXT PRIMARY KEY,
-        added_at TEXT
-    );
-    """)
-    conn.commit()
-    conn.close()
+    with get_connection(DB_FILE) as conn:
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS malware_hashes (
+            sha256 TEXT PRIMARY KEY,
+            added_at TEXT
+        );
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_malware_added_at ON malware_hashes (added_at);")
+
+def init_db():
+    create_tables()
+    load_signatures()
+
+# -----------------------
+# In-memory signature index
+# -----------------------
+# Outside writers (the watcher, a feed import in another process) only
+# ever insert, so a change to DB_FILE is caught up by loading the rows
+# past the highest rowid already indexed. A full rebuild - after a large
+# import, or once live additions outgrow the bloom filter - runs on a
+# background thread while lookups keep using the current index.
+def _db_stamp():
+    # the WAL file changes on every commit, the main file on checkpoints
+    stamp = []
+    for path in (DB_FILE, DB_FILE + "-wal"):
+        try:
+            st = os.stat(path)
+            stamp.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            stamp.append(None)
+    return tuple(stamp)
+
+def _build():
+    # (index, max rowid it covers), read in one snapshot
+    conn = get_connection(DB_FILE)
+    with conn:
+        conn.execute("BEGIN")
+        max_rowid = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM malware_hashes").fetchone()[0]
+        cur = conn.execute("SELECT sha256 FROM malware_hashes WHERE rowid <= ? ORDER BY sha256",
+                           (max_rowid,))
+        index = SignatureIndex.from_hex(row[0] for row in cur)
+    return index, max_rowid
+
+def _install(index, max_rowid):
+    # caller holds _index_lock
+    global _index, _index_rowid, _index_stamp, _last_check
+    _index, _index_rowid = index, max_rowid
+    _index_stamp = _db_stamp()
+    _last_check = time.monotonic()
+    if not _catch_up():
+        _index_stamp = None     # too much arrived meanwhile; rebuild again on the next check
+    print(f"[LocalDB] Loaded {len(_index)} signatures ({_index.memory_bytes() // 1024} KiB)")
+
+def _catch_up():
+    """Add rows inserted since the index was loaded; caller holds _index_lock.
+    Returns False when there are too many and a full rebuild should run."""
+    global _index_rowid
+    rows = get_connection(DB_FILE).execute(
+        "SELECT rowid, sha256 FROM malware_hashes WHERE rowid > ? ORDER BY rowid LIMIT ?",
+        (_index_rowid, INCREMENTAL_MAX + 1),
+    ).fetchall()
+    if len(rows) > INCREMENTAL_MAX:
+        return False
+    for rowid, sha256 in rows:
+        try:
+            _index.add(bytes.fromhex(sha256))
+        except (TypeError, ValueError):
+            pass
+        _index_rowid = rowid
+    return not _index.needs_rebuild()
+
+def _rebuild_in_background():
+    # caller holds _index_lock
+    global _rebuilding
+    if _rebuilding:
+        return
+    _rebuilding = True
+
+    def run():
+        global _rebuilding
+        try:
+            index, max_rowid = _build()
+            with _index_lock:
+                _install(index, max_rowid)
+        except Exception as e:
+            print(f"[LocalDB] Rebuilding the signature index failed: {e}")
+        finally:
+            with _index_lock:
+                _rebuilding = False
+
+    threading.Thread(target=run, name="signature-rebuild", daemon=True).start()
+
+def load_signatures():
+    """(Re)build the in-memory index from malware_hashes, synchronously."""
+    index, max_rowid = _build()
+    with _index_lock:
+        _install(index, max_rowid)
+
+def _refresh():
+    # one thread checks at a time; the others keep using the current index
+    global _last_check, _index_stamp
+    if not _index_lock.acquire(blocking=False):
+        return
+    try:
+        now = time.monotonic()
+        if now - _last_check < RELOAD_CHECK_INTERVAL:
+            return
+        _last_check = now
+        stamp = _db_stamp()
+        if stamp != _index_stamp or _index.needs_rebuild():
+            _index_stamp = stamp
+            if not _catch_up():
+                _rebuild_in_background()
+    finally:
+        _index_lock.release()
+
+def _current_index():
+    if _index is None:
+        load_signatures()
+    elif time.monotonic() - _last_check >= RELOAD_CHECK_INTERVAL:
+        _refresh()
+    return _index
 
 def is_malicious_local(sha256):
-    conn = sqlite3.connect(DB_FILE)
-    cur = conn.cursor()
-    cur.execute("SELECT 1 FROM malware_hashes WHERE sha256 = ?", (sha256,))
-    row = cur.fetchone()
-    conn.close()
-    return row is not None
+    try:
+        digest = bytes.fromhex(sha256)
+    except (TypeError, ValueError):
+        return False
+    return digest in _current_index()
+
+def local_verdict():
+    """Normalized result reported for a hash found in the signature DB."""
+    return verdict.attach({
+        "counts": {"malicious": 1, "suspicious": 0, "clean": 0, "harmless": 0},
+        "engines": {"LocalDB": {"result": "malicious", "engine_name": "Local Signature DB"}},
+    })
+
+def filter_malicious(hashes):
+    """Subset of hashes present in the signature DB (answered from memory)."""
+    index = _current_index()
+    found = set()
+    for sha256 in hashes:
+        try:
+            if bytes.fromhex(sha256) in index:
+                found.add(sha256)
+        except (TypeError, ValueError):
+            continue
+    return found
 
 def add_malicious_hash(sha256):
-    conn = sqlite3.connect(DB_FILE)
-    cur = conn.cursor()
-    cur.execute("INSERT OR IGNORE INTO malware_hashes (sha256, added_at) VALUES (?, ?)",
-                (sha256, datetime.utcnow().isoformat()))
-    conn.commit()
-    conn.close()
+    sha256 = sha256.lower()
+    with get_connection(DB_FILE) as conn:
+        conn.execute("INSERT OR IGNORE INTO malware_hashes (sha256, added_at) VALUES (?, ?)",
+                     (sha256, datetime.utcnow().isoformat()))
+    # visible at once; the next check's catch-up skips it as already present
+    _current_index().add(bytes.fromhex(sha256))
+
+# -----------------------
+# Bulk import of hash feeds
+# -----------------------
+def _sniff_format(path):
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("#"):
+                if "sha256_hash" in line:
+                    return "malwarebazaar"
+                continue
+            return "csv" if "," in line else "text"
+    return "text"
+
+def _csv_column(header):
+    names = [h.strip().strip('"').strip("# ").lower() for h in header]
+    for wanted in SHA256_COLUMNS:
+        if wanted in names:
+            return names.index(wanted)
+    return None
+
+def iter_feed_hashes(path, fmt="auto", stats=None):
+    """Yield lowercase sha256 strings from a feed file, streaming.
+
+    fmt is "text" (one hash per line, # comments), "csv" (a sha256 /
+    sha256_hash column, or the first cell that looks like one),
+    "malwarebazaar" (CSV dump with a commented header) or "auto".
+    Invalid entries are counted in stats["invalid"] and skipped.
+    """
+    if stats is None:
+        stats = {}
+    stats.setdefault("read", 0)
+    stats.setdefault("invalid", 0)
+
+    if fmt == "auto":
+        fmt = _sniff_format(path)
+
+    with open(path, "r", encoding="utf-8", errors="replace", newline="") as f:
+        if fmt == "text":
+            for line in f:
+                value = line.split("#", 1)[0].strip()
+                if not value:
+                    continue
+                value = value.split()[0]
+                stats["read"] += 1
+                if SHA256_RE.match(value):
+                    yield value.lower()
+                else:
+                    stats["invalid"] += 1
+            return
+
+        if fmt not in ("csv", "malwarebazaar"):
+            raise ValueError(f"Unknown feed format: {fmt}")
+
+        column = None
+        header_seen = False
+        if fmt == "malwarebazaar":
+            # data rows follow a '# "first_seen_utc","sha256_hash",...' comment header
+            for line in f:
+                if line.startswith("#") and "sha256_hash" in line:
+                    column = _csv_column(next(csv.reader([line.lstrip("# ")], skipinitialspace=True)))
+                    header_seen = True
+                    break
+
+        reader = csv.reader((l for l in f if not l.startswith("#")), skipinitialspace=True)
+        for row in reader:
+            if not row:
+                continue
+            if not header_seen:
+                header_seen = True
+                column = _csv_column(row)
+                if column is not None:
+                    continue
+            if column is not None:
+                value = row[column].strip() if column < len(row) else ""
+            else:
+                value = next((c.strip() for c in row if SHA256_RE.match(c.strip())), "")
+            stats["read"] += 1
+            if SHA256_RE.match(value):
+                yield value.lower()
+            else:
+                stats["invalid"] += 1
+
+def bulk_import(path, fmt="auto", batch_size=IMPORT_BATCH_SIZE, drop_indexes=None):
+    """Stream a hash feed into malware_hashes.
+
+    Rows go in with executemany, one transaction per batch, on a dedicated
+    connection with fsync relaxed for the duration. For large feeds the
+    secondary added_at index is dropped first and rebuilt once at the end;
+    the sha256 primary key stays since INSERT OR IGNORE relies on it.
+    Returns a stats dict (read, inserted, invalid, seconds, rows_per_sec).
+    """
+    if drop_indexes is None:
+        drop_indexes = os.path.getsize(path) >= IMPORT_DROP_INDEX_BYTES
+
+    stats = {"read": 0, "invalid": 0, "inserted": 0}
+    added_at = datetime.utcnow().isoformat()
+    start = time.perf_counter()
+    next_report = IMPORT_REPORT_EVERY
+
+    conn = sqlite3.connect(DB_FILE, timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=OFF;")
+        conn.execute("PRAGMA cache_size=-262144;")
+        if drop_indexes:
+            conn.execute("DROP INDEX IF EXISTS idx_malware_added_at;")
+
+        before = conn.total_changes
+        batch = []
+        for sha256 in iter_feed_hashes(path, fmt, stats):
+            batch.append((sha256, added_at))
+            if len(batch) >= batch_size:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO malware_hashes (sha256, added_at) VALUES (?, ?)", batch)
+                batch = []
+            if stats["read"] >= next_report:
+                next_report += IMPORT_REPORT_EVERY
+                rate = stats["read"] / (time.perf_counter() - start)
+                print(f"[LocalDB] Import: {stats['read']} rows read, {rate:.0f} rows/s")
+        if batch:
+            with conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO malware_hashes (sha256, added_at) VALUES (?, ?)", batch)
+        stats["inserted"] = conn.total_changes - before
+
+        if drop_indexes:
+            with conn:
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_malware_added_at ON malware_hashes (added_at);")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+    finally:
+        conn.close()
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["rows_per_sec"] = stats["read"] / stats["seconds"] if stats["seconds"] else 0.0
+    print(f"[LocalDB] Imported {stats['inserted']} new hashes from {path} "
+          f"({stats['read']} read, {stats['invalid']} invalid) "
+          f"in {stats['seconds']:.1f}s, {stats['rows_per_sec']:.0f} rows/s")
+
+    if _index is not None:
+        with _index_lock:
+            _rebuild_in_background()
+    return stats
 
 def list_hashes(limit=100):
-    conn = sqlite3.connect(DB_FILE)
-    cur = conn.cursor()
-    cur.execute("SELECT sha256, added_at FROM malware_hashes ORDER BY added_at DESC LIMIT ?", (limit,))
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+    conn = get_connection(DB_FILE)
+    return conn.execute(
+        "SELECT sha256, added_at FROM malware_hashes ORDER BY added_at DESC LIMIT ?",
+        (limit,),
+    ).fetchall()
+
+def main():
+    parser = argparse.ArgumentParser(description="Local malware signature DB")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    imp = sub.add_parser("import", help="bulk import a hash feed")
+    imp.add_argument("path")
+    imp.add_argument("--format", default="auto", choices=["auto", "text", "csv", "malwarebazaar"])
+    imp.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    imp.add_argument("--drop-indexes", action="store_true", default=None,
+                     help="drop secondary indexes during the import regardless of feed size")
+
+    args = parser.parse_args()
+    create_tables()
+    if args.command == "import":
+        bulk_import(args.path, args.format, args.batch_size, args.drop_indexes)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+# log_store.py
+# Read side of the event log: cursor-paginated, filtered queries whose cost
+# depends on the page size, not on the length of the history.
+#
+# For the jsonl backend an offset index (LOG_INDEX_DB) maps every record to
+# (segment, byte offset). It is refreshed incrementally by reading only the
+# bytes appended since the last refresh, so a page is an indexed SELECT plus
+# one seek+readline per record.
+import json
+import os
+import threading
+
+from config import LOG_MODE, JSON_LOG_FILE, JSONL_LOG_FILE, SQLITE_DB_FILE, LOG_INDEX_DB
+from logger import rotated_segments, ensure_sqlite_setup
+from db_pool import get_connection
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+ACTIVE_SEGMENT = 0      # segment number used for the active (unrotated) file
+
+_refresh_lock = threading.Lock()
+
+
+# -----------------------
+# Offset index (jsonl)
+# -----------------------
+def init_index():
+    conn = get_connection(LOG_INDEX_DB)
+    backfill = not _has_table(conn, "log_event_types")
+    conn.executescript("""
+    CREATE TABLE IF NOT EXISTS log_index (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        segment INTEGER,             -- rotated seq, 0 = active file
+        offset INTEGER,
+        length INTEGER,
+        timestamp TEXT,
+        event_type TEXT,
+        sha256 TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_log_index_type ON log_index (event_type, id);
+    CREATE INDEX IF NOT EXISTS idx_log_index_sha256 ON log_index (sha256);
+    CREATE INDEX IF NOT EXISTS idx_log_index_ts ON log_index (timestamp);
+    CREATE TABLE IF NOT EXISTS index_state (
+        name TEXT PRIMARY KEY,
+        value INTEGER
+    );
+    CREATE TABLE IF NOT EXISTS log_event_types (
+        event_type TEXT PRIMARY KEY  -- every type indexed so far, for the filter dropdown
+    );
+    """)
+    if backfill:
+        # indexes built before log_event_types existed
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO log_event_types "
+                         "SELECT DISTINCT event_type FROM log_index WHERE event_type IS NOT NULL")
+
+
+def _has_table(conn, name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?",
+                        (name,)).fetchone() is not None
+
+
+def _get_state(cur, name):
+    row = cur.execute("SELECT value FROM index_state WHERE name=?", (name,)).fetchone()
+    return row[0] if row else None
+
+
+def _set_state(cur, name, value):
+    cur.execute("""
+        INSERT INTO index_state (name, value) VALUES (?, ?)
+        ON CONFLICT(name) DO UPDATE SET value=excluded.value
+    """, (name, value))
+
+
+def _index_file(cur, path, segment, start):
+    """Index complete lines of path from byte offset start. Returns the new end offset."""
+    rows = []
+    offset = start
+    with open(path, "rb") as f:
+        f.seek(start)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break       # partially written record, pick it up next time
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = {}
+            hashes = record.get("hashes") or {}
+            sha256 = hashes.get("sha256") if isinstance(hashes, dict) else None
+            rows.append((
+                segment, offset, len(line),
+                record.get("timestamp"),
+                record.get("event_type"),
+                sha256.lower() if isinstance(sha256, str) else None,
+            ))
+            offset += len(line)
+
+    cur.executemany("""
+        INSERT INTO log_index (segment, offset, length, timestamp, event_type, sha256)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, rows)
+    cur.executemany("INSERT OR IGNORE INTO log_event_types (event_type) VALUES (?)",
+                    [(t,) for t in {row[4] for row in rows} if isinstance(t, str)])
+    return offset
+
+
+def refresh_index():
+    """Bring the offset index up to date with the jsonl files on disk."""
+    with _refresh_lock, get_connection(LOG_INDEX_DB) as conn:
+        cur = conn.cursor()
+
+        inode = _get_state(cur, "active_inode")
+        offset = _get_state(cur, "active_offset") or 0
+        last_segment = _get_state(cur, "last_segment") or 0
+        segments = rotated_segments(JSONL_LOG_FILE)
+
+        try:
+            st = os.stat(JSONL_LOG_FILE)
+        except FileNotFoundError:
+            st = None
+
+        if inode is not None and (st is None or st.st_ino != inode):
+            # the active file was rotated (or replaced) since the last refresh
+            rotated = None
+            for seq, path in reversed(segments):
+                if os.stat(path).st_ino == inode:
+                    rotated = (seq, path)
+                    break
+
+            if rotated is None:
+                cur.execute("DELETE FROM log_index WHERE segment=?", (ACTIVE_SEGMENT,))
+            else:
+                seq, path = rotated
+                cur.execute("UPDATE log_index SET segment=? WHERE segment=?",
+                            (seq, ACTIVE_SEGMENT))
+                _index_file(cur, path, seq, offset)
+                last_segment = max(last_segment, seq)
+            offset = 0
+        elif st is not None and st.st_size < offset:
+            # truncated in place
+            cur.execute("DELETE FROM log_index WHERE segment=?", (ACTIVE_SEGMENT,))
+            offset = 0
+
+        # segments rotated out without ever being seen as the active file
+        for seq, path in segments:
+            if seq > last_segment:
+                _index_file(cur, path, seq, 0)
+                last_segment = seq
+
+        # forget segments removed by JSONL_BACKUP_COUNT
+        live = [seq for seq, _ in segments] + [ACTIVE_SEGMENT]
+        cur.execute(
+            f"DELETE FROM log_index WHERE segment NOT IN ({','.join('?' * len(live))})",
+            live,
+        )
+
+        if st is not None:
+            offset = _index_file(cur, JSONL_LOG_FILE, ACTIVE_SEGMENT, offset)
+            _set_state(cur, "active_inode", st.st_ino)
+        _set_state(cur, "active_offset", offset)
+        _set_state(cur, "last_segment", last_segment)
+
+
+def _segment_path(segment):
+    if segment == ACTIVE_SEGMENT:
+        return JSONL_LOG_FILE
+    return f"{JSONL_LOG_FILE}.{segment}"
+
+
+def _read_records(rows):
+    """Yield records for index rows, reading each with a single seek."""
+    handles = {}
+    try:
+        for row_id, segment, offset, length in rows:
+            f = handles.get(segment)
+            if f is None:
+                try:
+                    f = handles[segment] = open(_segment_path(segment), "rb")
+                except FileNotFoundError:
+                    continue
+            f.seek(offset)
+            try:
+                record = json.loads(f.read(length))
+            except ValueError:
+                continue
+            record["id"] = row_id
+            yield record
+    finally:
+        for f in handles.values():
+            f.close()
+
+
+def _where(before, event_type, since, until, sha256, ts_col="timestamp", sha_col="sha256"):
+    clauses, params = [], []
+    if before is not None:
+        clauses.append("id < ?")
+        params.append(before)
+    if event_type:
+        clauses.append("event_type = ?")
+        params.append(event_type)
+    if since:
+        clauses.append(f"{ts_col} >= ?")
+        params.append(since)
+    if until:
+        clauses.append(f"{ts_col} <= ?")
+        params.append(_end_of(until))
+    if sha256:
+        clauses.append(f"{sha_col} = ?")
+        params.append(sha256.lower())
+    sql = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+    return sql, params
+
+
+def _end_of(until):
+    # a bare date means "up to the end of that day"
+    return until + "T23:59:59" if len(until) == 10 else until
+
+
+def _query_jsonl(before, limit, event_type, since, until, sha256):
+    refresh_index()
+    where, params = _where(before, event_type, since, until, sha256)
+    rows = get_connection(LOG_INDEX_DB).execute(
+        f"SELECT id, segment, offset, length FROM log_index{where} ORDER BY id DESC LIMIT ?",
+        params + [limit + 1],
+    ).fetchall()
+    next_before = rows[limit - 1][0] if len(rows) > limit else None
+    return _read_records(rows[:limit]), next_before
+
+
+# -----------------------
+# SQLite backend
+# -----------------------
+def _query_sqlite(before, limit, event_type, since, until, sha256):
+    ensure_sqlite_setup()
+    where, params = _where(before, event_type, since, until, sha256,
+                           sha_col="json_extract(hashes, '$.sha256')")
+    rows = get_connection(SQLITE_DB_FILE).execute(
+        f"SELECT id, timestamp, event_type, file_path, url, hashes, vt_result FROM logs{where} "
+        f"ORDER BY id DESC LIMIT ?",
+        params + [limit + 1],
+    ).fetchall()
+    next_before = rows[limit - 1][0] if len(rows) > limit else None
+
+    def records():
+        for row in rows[:limit]:
+            yield {
+                "id": row[0],
+                "timestamp": row[1],
+                "event_type": row[2],
+                "file_path": row[3],
+                "url": row[4],
+                "hashes": json.loads(row[5]) if row[5] else None,
+                "vt_result": json.loads(row[6]) if row[6] else None,
+            }
+
+    return records(), next_before
+
+
+# -----------------------
+# Legacy json backend
+# -----------------------
+def _query_json(before, limit, event_type, since, until, sha256):
+    # the legacy format has no index; it is parsed whole as before
+    if not os.path.exists(JSON_LOG_FILE):
+        return iter(()), None
+    data = json.load(open(JSON_LOG_FILE))
+
+    start = len(data) if before is None else min(before - 1, len(data))
+    matches = []
+    for row_id in range(start, 0, -1):
+        record = data[row_id - 1]
+        hashes = record.get("hashes") or {}
+        ts = record.get("timestamp") or ""
+        if event_type and record.get("event_type") != event_type:
+            continue
+        if since and ts < since:
+            continue
+        if until and ts > _end_of(until):
+            continue
+        if sha256 and hashes.get("sha256") != sha256.lower():
+            continue
+        matches.append(dict(record, id=row_id))
+        if len(matches) > limit:
+            break
+
+    next_before = matches[limit - 1]["id"] if len(matches) > limit else None
+    return iter(matches[:limit]), next_before
+
+
+# -----------------------
+# Unified query API
+# -----------------------
+def query_logs(before=None, limit=DEFAULT_PAGE_SIZE, event_type=None,
+               since=None, until=None, sha256=None):
+    """Return (records, next_before) for one page, newest first.
+
+    records is a lazy iterator of log dicts (each with an "id"); pass
+    next_before back as `before` to get the following page, None means
+    there are no older records.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    if LOG_MODE == "jsonl":
+        return _query_jsonl(before, limit, event_type, since, until, sha256)
+    elif LOG_MODE == "sqlite":
+        return _query_sqlite(before, limit, event_type, since, until, sha256)
+    elif LOG_MODE == "json":
+        return _query_json(before, limit, event_type, since, until, sha256)
+    else:
+        raise ValueError("Invalid LOG_MODE specified.")
+
+
+def event_types():
+    """Event types seen so far, for the filter dropdown (read from the small
+    log_event_types table kept next to the log, not from the log itself)."""
+    if LOG_MODE == "jsonl":
+        rows = get_connection(LOG_INDEX_DB).execute(
+            "SELECT event_type FROM log_event_types").fetchall()
+    elif LOG_MODE == "sqlite":
+        ensure_sqlite_setup()
+        rows = get_connection(SQLITE_DB_FILE).execute(
+            "SELECT event_type FROM log_event_types").fetchall()
+    else:
+        return []
+    return sorted(r[0] for r in rows if r[0])
@@ -1,8 +1,14 @@
 import json
-import sqlite3
 import os
+import atexit
+import threading
+import time
 from datetime import datetime
-from config import LOG_MODE, JSON_LOG_FILE, SQLITE_DB_FILE
+from db_pool import get_connection
+from config import (
+    LOG_MODE, JSON_LOG_FILE, JSONL_LOG_FILE, SQLITE_DB_FILE,
+    JSONL_FSYNC, JSONL_FSYNC_INTERVAL, JSONL_MAX_BYTES, JSONL_BACKUP_COUNT,
+)
 
 
 # -----------------------
@@ -22,46 +28,206 @@ def log_json(record):
         json.dump(data, f, indent=2)
 
 
+# -----------------------
+# JSONL Logging (append-only)
+# -----------------------
+def rotated_segments(path=JSONL_LOG_FILE):
+    """Return [(seq, path), ...] of rotated segments, oldest first.
+
+    Rotated files are named <path>.<seq> with a monotonically increasing
+    seq, so a segment keeps its name for as long as it exists.
+    """
+    folder = os.path.dirname(path) or "."
+    prefix = os.path.basename(path) + "."
+    segments = []
+    if not os.path.isdir(folder):
+        return segments
+    for name in os.listdir(folder):
+        if name.startswith(prefix) and name[len(prefix):].isdigit():
+            segments.append((int(name[len(prefix):]), os.path.join(folder, name)))
+    segments.sort()
+    return segments
+
+
+class JsonlWriter:
+    """Appends one JSON record per line to a size-rotated file.
+
+    Every record is handed to the OS in a single write so concurrent
+    writers (watcher threads or separate processes) never interleave
+    partial lines. fsync is controlled by the policy:
+      "always"   - fsync after every record
+      "interval" - fsync at most every fsync_interval seconds
+      "never"    - leave it to the OS
+    """
+
+    def __init__(self, path, fsync="interval", fsync_interval=5.0,
+                 max_bytes=0, backup_count=0):
+        if fsync not in ("always", "interval", "never"):
+            raise ValueError("Invalid JSONL_FSYNC policy specified.")
+        self.path = path
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._lock = threading.Lock()
+        self._fh = None
+        self._inode = None
+        self._last_sync = time.monotonic()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._fh = open(self.path, "ab", buffering=64 * 1024)
+        self._inode = os.fstat(self._fh.fileno()).st_ino
+
+    def _close(self):
+        if self._fh is None:
+            return
+        try:
+            self._fh.flush()
+            if self.fsync != "never":
+                os.fsync(self._fh.fileno())
+        finally:
+            self._fh.close()
+            self._fh = None
+
+    def _rotated_elsewhere(self):
+        # another process may have rotated the file under us
+        try:
+            return os.stat(self.path).st_ino != self._inode
+        except FileNotFoundError:
+            return True
+
+    def _rotate(self):
+        self._close()
+        segments = rotated_segments(self.path)
+        next_seq = segments[-1][0] + 1 if segments else 1
+        try:
+            os.replace(self.path, f"{self.path}.{next_seq}")
+        except OSError as e:
+            # e.g. file held open by another process on Windows; retry later
+            print(f"[Logger] Rotation skipped: {e}")
+        else:
+            segments.append((next_seq, f"{self.path}.{next_seq}"))
+            if self.backup_count:
+                for _, old in segments[:-self.backup_count]:
+                    try:
+                        os.remove(old)
+                    except OSError:
+                        pass
+        self._open()
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        data = line.encode("utf-8")
+
+        with self._lock:
+            if self._fh is None:
+                self._open()
+            elif self._rotated_elsewhere():
+                self._close()
+                self._open()
+
+            if self.max_bytes:
+                size = os.fstat(self._fh.fileno()).st_size
+                if size and size + len(data) > self.max_bytes:
+                    self._rotate()
+
+            self._fh.write(data)
+            self._fh.flush()
+
+            now = time.monotonic()
+            if self.fsync == "always" or (
+                self.fsync == "interval" and now - self._last_sync >= self.fsync_interval
+            ):
+                os.fsync(self._fh.fileno())
+                self._last_sync = now
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+
+_jsonl_writer = None
+_jsonl_writer_lock = threading.Lock()
+
+
+def get_jsonl_writer():
+    global _jsonl_writer
+    if _jsonl_writer is None:
+        with _jsonl_writer_lock:
+            if _jsonl_writer is None:
+                _jsonl_writer = JsonlWriter(
+                    JSONL_LOG_FILE,
+                    fsync=JSONL_FSYNC,
+                    fsync_interval=JSONL_FSYNC_INTERVAL,
+                    max_bytes=JSONL_MAX_BYTES,
+                    backup_count=JSONL_BACKUP_COUNT,
+                )
+                atexit.register(_jsonl_writer.close)
+    return _jsonl_writer
+
+
+def log_jsonl(record):
+    get_jsonl_writer().write(record)
+
+
 # -----------------------
 # SQLite Logging
 # -----------------------
+_sqlite_ready = False
+
+
 def ensure_sqlite_setup():
-    conn = sqlite3.connect(SQLITE_DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT,
-            event_type TEXT,
-            file_path TEXT,
-            url TEXT,
-            hashes TEXT,
-            vt_result TEXT
-        );
-    """)
-    conn.commit()
-    conn.close()
+    global _sqlite_ready
+    if _sqlite_ready:
+        return
+    with get_connection(SQLITE_DB_FILE) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT,
+                event_type TEXT,
+                file_path TEXT,
+                url TEXT,
+                hashes TEXT,
+                vt_result TEXT
+            );
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_event_type ON logs (event_type, id);")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs (timestamp);")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_sha256 ON logs (json_extract(hashes, '$.sha256'));")
+
+        # distinct event types for the /logs filter, kept current by a trigger
+        backfill = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' "
+                                "AND name='log_event_types'").fetchone() is None
+        conn.execute("CREATE TABLE IF NOT EXISTS log_event_types (event_type TEXT PRIMARY KEY);")
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS logs_event_type AFTER INSERT ON logs
+            WHEN NEW.event_type IS NOT NULL
+            BEGIN
+                INSERT OR IGNORE INTO log_event_types (event_type) VALUES (NEW.event_type);
+            END;
+        """)
+        if backfill:
+            conn.execute("INSERT OR IGNORE INTO log_event_types "
+                         "SELECT DISTINCT event_type FROM logs WHERE event_type IS NOT NULL")
+    _sqlite_ready = True
 
 
 def log_sqlite(record):
     ensure_sqlite_setup()
-    conn = sqlite3.connect(SQLITE_DB_FILE)
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        INSERT INTO logs (timestamp, event_type, file_path, url, hashes, vt_result)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (
-        record.get("timestamp"),
-        record.get("event_type"),
-        record.get("file_path"),
-        record.get("url"),
-        json.dumps(record.get("hashes")),
-        json.dumps(record.get("vt_result")),
-    ))
-
-    conn.commit()
-    conn.close()
+    with get_connection(SQLITE_DB_FILE) as conn:
+        conn.execute("""
+            INSERT INTO logs (timestamp, event_type, file_path, url, hashes, vt_result)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (
+            record.get("timestamp"),
+            record.get("event_type"),
+            record.get("file_path"),
+            record.get("url"),
+            json.dumps(record.get("hashes")),
+            json.dumps(record.get("vt_result")),
+        ))
 
 
 # -----------------------
@@ -77,7 +243,9 @@ def log_event(event_type, file_path=None, url=None, hashes=None, vt_result=None)
         "vt_result": vt_result,
     }
 
-    if LOG_MODE == "json":
+    if LOG_MODE == "jsonl":
+        log_jsonl(record)
+    elif LOG_MODE == "json":
         log_json(record)
     elif LOG_MODE == "sqlite":
         log_sqlite(record)
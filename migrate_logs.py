@@ -0,0 +1,63 @@
+# migrate_logs.py
+# One-off conversion of the legacy logs.json array into the append-only
+# logs.jsonl format used by LOG_MODE = "jsonl".
+#
+#   python migrate_logs.py [--src logs.json] [--dst logs.jsonl]
+import argparse
+import json
+import os
+
+from config import JSON_LOG_FILE, JSONL_LOG_FILE
+
+
+def migrate_json_to_jsonl(src=JSON_LOG_FILE, dst=JSONL_LOG_FILE):
+    """Write every record of src to dst, one per line.
+
+    Records already present in dst (logged after switching to jsonl) are
+    kept after the migrated ones so the file stays in chronological order.
+    Returns the number of migrated records.
+    """
+    with open(src, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    if not isinstance(records, list):
+        raise ValueError(f"{src} does not contain a JSON array")
+
+    tmp = dst + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as out:
+        for record in records:
+            out.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+        if os.path.exists(dst):
+            with open(dst, "r", encoding="utf-8") as existing:
+                for line in existing:
+                    out.write(line)
+
+        out.flush()
+        os.fsync(out.fileno())
+
+    os.replace(tmp, dst)
+    return len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert logs.json into logs.jsonl")
+    parser.add_argument("--src", default=JSON_LOG_FILE)
+    parser.add_argument("--dst", default=JSONL_LOG_FILE)
+    parser.add_argument("--keep", action="store_true",
+                        help="leave the source file in place instead of renaming it")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.src):
+        print(f"[Migrate] Nothing to do: {args.src} not found")
+        return
+
+    count = migrate_json_to_jsonl(args.src, args.dst)
+    print(f"[Migrate] {count} records written to {args.dst}")
+
+    if not args.keep:
+        os.replace(args.src, args.src + ".migrated")
+        print(f"[Migrate] {args.src} renamed to {args.src}.migrated")
+
+
+if __name__ == "__main__":
+    main()
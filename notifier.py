@@ -1,42 +1,422 @@
+import atexit
+import queue
 import smtplib
+import threading
+import time
 import requests
 import json
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from config import *
+from ratelimit import TokenBucket
+import verdict
 
 MAX_DISCORD_MESSAGE = 1900  # Discord limit buffer
+MAX_TELEGRAM_MESSAGE = 4000
+DIGEST_LINES = 25           # alerts listed in one digest before "... and N more"
 
-def summarize_threats(scan_results, limit=5):
-    threats = []
+_STOP = object()
 
-    for engine, data in scan_results.items():
-        category = data.get("category", "").lower()
-        result = data.get("result", "")
-        if category in ("malicious", "suspicious"):
-            threats.append((engine, result))
+def summarize_threats(vt_result, limit=5):
+    """(detections, [(engine, category), ...]) from the result's stored verdict."""
+    summary = verdict.of(vt_result)
+    return summary.detections, list(summary.top[:limit])
 
-    threats.sort(key=lambda x: x[0])
-    total = len(threats)
-    summary = threats[:limit]
 
-    return total, summary
+class RetryLater(Exception):
+    """The channel asked us to back off (HTTP 429)."""
 
-def send_email(subject, body):
-    if not ENABLE_EMAIL:
-        return
-    try:
+    def __init__(self, seconds):
+        super().__init__(f"rate limited, retry after {seconds:.1f}s")
+        self.seconds = seconds
+
+
+# -----------------------
+# Channel senders
+# -----------------------
+def _check_response(response):
+    if response.status_code == 429:
+        try:
+            retry_after = float(response.json().get("retry_after", 0))
+        except (ValueError, TypeError, AttributeError):
+            # not JSON, or JSON that is not an object
+            retry_after = 0
+        if not retry_after:
+            try:
+                retry_after = float(response.headers.get("Retry-After", 1))
+            except ValueError:
+                retry_after = 1
+        raise RetryLater(retry_after)
+    # 5xx is retried by the channel, other errors are not going to get better
+    response.raise_for_status()
+
+def post_discord(webhook_url, message):
+    response = requests.post(webhook_url, json={"content": message}, timeout=10)
+    print(f"[Discord] HTTP {response.status_code}")
+    _check_response(response)
+
+def post_telegram(bot_token, chat_id, message):
+    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+    response = requests.post(url, data={"chat_id": chat_id, "text": message}, timeout=10)
+    _check_response(response)
+
+
+class SmtpSender:
+    """Keeps one SMTP connection (STARTTLS + login done once) across messages."""
+
+    def __init__(self, host, port, username="", password="", starttls=True,
+                 sender=None, recipients=(), idle_timeout=SMTP_IDLE_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.sender = sender or username
+        self.recipients = list(recipients)
+        self.idle_timeout = idle_timeout
+        self._server = None
+        self._last_used = 0.0
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.starttls:
+            server.starttls()
+        if self.username:
+            server.login(self.username, self.password)
+        return server
+
+    def _alive(self):
+        try:
+            return self._server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    def send(self, subject, body):
         msg = MIMEMultipart()
-        msg['From'] = EMAIL_USERNAME
-        msg['To'] = ", ".join(EMAIL_TO)
+        msg['From'] = self.sender
+        msg['To'] = ", ".join(self.recipients)
         msg['Subject'] = subject
         msg.attach(MIMEText(body, 'plain'))
 
-        server = smtplib.SMTP(EMAIL_SMTP_SERVER, EMAIL_SMTP_PORT)
-        server.starttls()
-        server.login(EMAIL_USERNAME, EMAIL_PASSWORD)
-        server.sendmail(EMAIL_USERNAME, EMAIL_TO, msg.as_string())
-        server.quit()
+        if self._server is None or not self._alive():
+            self.close()
+            self._server = self._connect()
+        try:
+            self._server.sendmail(self.sender, self.recipients, msg.as_string())
+        except (smtplib.SMTPServerDisconnected, OSError):
+            # drop it; the retry opens a fresh connection
+            self._server = None
+            raise
+        self._last_used = time.monotonic()
+
+    def close_if_idle(self):
+        if self._server is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self.close()
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+
+# -----------------------
+# Dispatcher
+# -----------------------
+class Channel:
+    """One outbound channel: its own queue, thread, rate limit and retries."""
+
+    def __init__(self, name, send, rate_per_min, max_length=None,
+                 max_retries=NOTIFY_MAX_RETRIES, max_rate_limited=NOTIFY_MAX_RATE_LIMITED,
+                 backoff=2.0, on_idle=None, idle_interval=10):
+        self.name = name
+        self.send = send                    # send(subject, body)
+        self.max_length = max_length
+        self.max_retries = max_retries
+        self.max_rate_limited = max_rate_limited
+        self.backoff = backoff
+        self.on_idle = on_idle
+        self.idle_interval = idle_interval
+        self.bucket = TokenBucket(rate_per_min / 60.0, capacity=5)
+        self.stats = {"sent": 0, "retried": 0, "failed": 0}
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"notify-{name}", daemon=True)
+        self._thread.start()
+
+    def put(self, subject, body):
+        self._queue.put((subject, body))
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.idle_interval)
+            except queue.Empty:
+                if self.on_idle is not None:
+                    self.on_idle()
+                continue
+            if item is _STOP:
+                if self.on_idle is not None:
+                    self.on_idle(force=True)
+                return
+            self._deliver(*item)
+
+    def _deliver(self, subject, body):
+        attempt = 0
+        rate_limited = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                self.send(subject, body)
+                self.stats["sent"] += 1
+                return
+            except RetryLater as e:
+                # the server's own pacing; capped on its own, not against retries
+                rate_limited += 1
+                if rate_limited > self.max_rate_limited:
+                    print(f"[{self.name}] Failed: still rate limited after {self.max_rate_limited} waits")
+                    self.stats["failed"] += 1
+                    return
+                print(f"[{self.name}] Rate limited, waiting {e.seconds:.1f}s")
+                self.bucket.pause(e.seconds)
+                continue
+            except requests.HTTPError as e:
+                if e.response is not None and e.response.status_code < 500:
+                    print(f"[{self.name}] Failed: {e}")
+                    self.stats["failed"] += 1
+                    return
+                error = e
+            except Exception as e:
+                error = e
+
+            attempt += 1
+            if attempt > self.max_retries:
+                print(f"[{self.name}] Failed after {self.max_retries} retries: {error}")
+                self.stats["failed"] += 1
+                return
+            self.stats["retried"] += 1
+            time.sleep(self.backoff ** attempt)
+
+    def stop(self, timeout=None):
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+
+def _format_digest(alerts, max_length=None):
+    """One message for one alert (as before), a digest for several."""
+    if len(alerts) == 1:
+        subject = f"Threat Detected — {alerts[0]['event_type']}"
+        return subject, alerts[0]["text"][:max_length] if max_length else alerts[0]["text"]
+
+    subject = f"{len(alerts)} threats detected"
+    lines = [f"⚠️ {len(alerts)} threats detected"]
+    shown = 0
+    for alert in alerts[:DIGEST_LINES]:
+        line = f"• {alert['line']}"
+        if max_length and sum(len(l) + 1 for l in lines) + len(line) + 40 > max_length:
+            break
+        lines.append(line)
+        shown += 1
+    if shown < len(alerts):
+        lines.append(f"... and {len(alerts) - shown} more")
+    return subject, "\n".join(lines)
+
+
+class NotificationDispatcher:
+    """Queues alerts off the scanning threads and sends them in digests.
+
+    The first alert opens a `window`; everything that arrives before it
+    closes goes out as one message per channel.
+    """
+
+    def __init__(self, channels, window=NOTIFY_DIGEST_WINDOW):
+        self.channels = channels
+        self.window = window
+        self._queue = queue.Queue()
+        self._stopping = threading.Event()
+        self.stats = {"alerts": 0, "digests": 0}
+        self._thread = threading.Thread(target=self._run, name="notify-dispatch", daemon=True)
+        self._thread.start()
+
+    def submit(self, alert):
+        self.stats["alerts"] += 1
+        self._queue.put(alert)
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.window
+            stop = False
+            while True:
+                # once the window closes (or we are stopping) take only what is already queued
+                remaining = 0 if self._stopping.is_set() else deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._dispatch(batch)
+            if stop:
+                return
+
+    def _dispatch(self, alerts):
+        self.stats["digests"] += 1
+        for channel in self.channels:
+            channel.put(*_format_digest(alerts, channel.max_length))
+
+    def stop(self, timeout=10):
+        """Send whatever is still queued, then stop the channels."""
+        self._stopping.set()
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        for channel in self.channels:
+            channel.stop(timeout)
+
+
+def _default_channels():
+    channels = []
+    if ENABLE_DISCORD and DISCORD_WEBHOOK_URL:
+        channels.append(Channel(
+            "Discord", lambda subject, body: post_discord(DISCORD_WEBHOOK_URL, body),
+            NOTIFY_RATE_PER_MIN["discord"], max_length=MAX_DISCORD_MESSAGE))
+    if ENABLE_TELEGRAM and TELEGRAM_BOT_TOKEN:
+        channels.append(Channel(
+            "Telegram", lambda subject, body: post_telegram(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, body),
+            NOTIFY_RATE_PER_MIN["telegram"], max_length=MAX_TELEGRAM_MESSAGE))
+    if ENABLE_EMAIL and EMAIL_TO and EMAIL_SMTP_SERVER:
+        smtp = SmtpSender(EMAIL_SMTP_SERVER, EMAIL_SMTP_PORT, EMAIL_USERNAME, EMAIL_PASSWORD,
+                          EMAIL_STARTTLS, recipients=EMAIL_TO)
+        channels.append(Channel(
+            "Email", smtp.send, NOTIFY_RATE_PER_MIN["email"],
+            on_idle=lambda force=False: smtp.close() if force else smtp.close_if_idle()))
+    return channels
+
+
+# -----------------------
+# Repeat suppression
+# -----------------------
+def _describe_window(seconds):
+    if seconds >= 3600 and seconds % 3600 == 0:
+        hours = int(seconds // 3600)
+        return "hour" if hours == 1 else f"{hours} hours"
+    if seconds >= 60:
+        return f"{seconds / 60:.0f} minutes"
+    return f"{seconds:.0f} seconds"
+
+
+class SuppressionIndex:
+    """Remembers which sha256/URL keys were alerted recently.
+
+    The first sighting of a key alerts; repeats within `window` seconds only
+    bump a counter. When the window ends, sweep() hands back the keys that
+    were seen again so a single summary can go out instead.
+    """
+
+    def __init__(self, window=NOTIFY_SUPPRESS_WINDOW):
+        self.window = window
+        self._entries = {}      # key -> {"alerted_at", "suppressed", "last_seen", "where", "event_type"}
+        self._lock = threading.Lock()
+        self.stats = {"alerted": 0, "suppressed": 0, "summaries": 0}
+
+    def check(self, key, where, event_type):
+        """(send, carried): send is False for a repeat inside the window;
+        carried counts repeats from an expired window not yet summarized."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry["alerted_at"] < self.window:
+                entry["suppressed"] += 1
+                entry["last_seen"] = now
+                entry["where"] = where
+                self.stats["suppressed"] += 1
+                return False, 0
+            carried = entry["suppressed"] if entry is not None else 0
+            self._entries[key] = {"alerted_at": now, "suppressed": 0, "last_seen": now,
+                                  "where": where, "event_type": event_type}
+            self.stats["alerted"] += 1
+            return True, carried
+
+    def sweep(self):
+        """Drop expired entries; return [(key, entry)] for those with repeats."""
+        now = time.time()
+        due = []
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if now - entry["alerted_at"] >= self.window:
+                    del self._entries[key]
+                    if entry["suppressed"]:
+                        due.append((key, entry))
+            self.stats["summaries"] += len(due)
+        return due
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+_suppression = SuppressionIndex()
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+def _summary_alert(key, entry, window):
+    target = key.split(":", 1)[1]
+    n = entry["suppressed"]
+    text = (f"🔁 Repeat detections — {entry['event_type']}\n"
+            f"`{target}` was seen {n} more time{'s' if n != 1 else ''} in the last {_describe_window(window)}"
+            f"\nLast seen: `{entry['where']}`")
+    line = f"`{target}` seen {n} more time{'s' if n != 1 else ''} (last: `{entry['where']}`)"
+    return {"event_type": entry["event_type"], "text": text, "line": line}
+
+def _sweep_loop(index):
+    interval = max(1.0, min(60.0, index.window / 4))
+    while True:
+        time.sleep(interval)
+        for key, entry in index.sweep():
+            get_dispatcher().submit(_summary_alert(key, entry, index.window))
+
+def _ensure_sweeper():
+    global _sweeper
+    if _sweeper is None:
+        with _sweeper_lock:
+            if _sweeper is None:
+                _sweeper = threading.Thread(target=_sweep_loop, args=(_suppression,),
+                                            name="notify-sweep", daemon=True)
+                _sweeper.start()
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def get_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = NotificationDispatcher(_default_channels())
+                atexit.register(_dispatcher.stop)
+    return _dispatcher
+
+
+# -----------------------
+# Direct (synchronous) senders
+# -----------------------
+def send_email(subject, body):
+    if not ENABLE_EMAIL:
+        return
+    try:
+        smtp = SmtpSender(EMAIL_SMTP_SERVER, EMAIL_SMTP_PORT, EMAIL_USERNAME, EMAIL_PASSWORD,
+                          EMAIL_STARTTLS, recipients=EMAIL_TO)
+        smtp.send(subject, body)
+        smtp.close()
     except Exception as e:
         print(f"[Email] Failed: {e}")
 
@@ -45,32 +425,29 @@ def send_telegram(message):
     if not ENABLE_TELEGRAM:
         return
     try:
-        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-        data = {"chat_id": TELEGRAM_CHAT_ID, "text": message}
-        requests.post(url, data=data)
+        post_telegram(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, message)
     except Exception as e:
         print(f"[Telegram] Failed: {e}")
 
 
 def send_discord(message):
     try:
-        response = requests.post(DISCORD_WEBHOOK_URL, json={"content": message})
-        print(f"[Discord] HTTP {response.status_code}: {response.text}")
+        post_discord(DISCORD_WEBHOOK_URL, message)
     except Exception as e:
         print(f"[Discord] Exception: {e}")
 
 def notify(event_type, file_path=None, url=None, hashes=None, vt_result=None):
+    """Queue an alert for a malicious/suspicious result; returns immediately."""
     if not vt_result:
         return
 
-    # Extract counts safely
-    counts = vt_result.get("counts", {})
-    malicious = counts.get("malicious", 0)
-    suspicious = counts.get("suspicious", 0)
+    summary = verdict.of(vt_result)
+    malicious = summary.malicious
+    suspicious = summary.suspicious
 
     # Only notify if malicious or suspicious found
     if malicious == 0 and suspicious == 0:
-        print("[Notify] Clean. No Discord alert.")
+        print("[Notify] Clean. No alert.")
         return
 
     msg = f"⚠️ Threat Detected — {event_type}\n"
@@ -83,5 +460,23 @@ def notify(event_type, file_path=None, url=None, hashes=None, vt_result=None):
         msg += f"SHA256: `{hashes.get('sha256')}`\n"
 
     msg += f"\nDetection Summary: {malicious} malicious, {suspicious} suspicious"
+    if summary.ratio:
+        msg += f" ({summary.ratio} engines)"
+    if summary.top:
+        msg += "\nTop detections: " + ", ".join(f"{engine} ({category})" for engine, category in summary.top)
+
+    sha256 = (hashes or {}).get("sha256")
+    key = f"sha256:{sha256.lower()}" if sha256 else (f"url:{url}" if url else None)
+    if key is not None and NOTIFY_SUPPRESS_WINDOW > 0:
+        _ensure_sweeper()
+        send, carried = _suppression.check(key, file_path or url, event_type)
+        if not send:
+            print(f"[Notify] Repeat of {key} within the suppression window; counted, not sent")
+            return
+        if carried:
+            msg += f"\n(seen {carried} more time{'s' if carried != 1 else ''} since the previous alert)"
+
+    target = file_path or url or sha256 or ""
+    line = f"{event_type}: `{target}` ({malicious} malicious, {suspicious} suspicious)"
 
-    send_discord(msg)  # <- IMPORTANT change
\ No newline at end of file
+    get_dispatcher().submit({"event_type": event_type, "text": msg, "line": line})
@@ -0,0 +1,336 @@
+# quarantine_store.py
+# Content-addressed store for uploaded files.
+#
+# Each distinct payload is kept once, at UPLOAD_FOLDER/<sha256[:2]>/<sha256>
+# (".zst" appended when compressed). Uploading the same bytes again, under
+# any name, only adds a reference row: objects.refs counts the uploads and
+# the uploads table remembers the names they came in under. Disk use is
+# bounded by QUARANTINE_MAX_BYTES (least recently uploaded objects go first)
+# and QUARANTINE_MAX_AGE (checked by a background thread).
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import file_cache
+from db_pool import get_connection
+from config import (
+    UPLOAD_FOLDER, QUARANTINE_MAX_BYTES, QUARANTINE_MAX_AGE,
+    QUARANTINE_COMPRESS, QUARANTINE_ZSTD_LEVEL,
+)
+from hashing import compute_hashes
+
+try:
+    import zstandard   # optional: pip install zstandard
+except ImportError:
+    zstandard = None
+
+DB_FILE = "quarantine.db"
+EVICT_INTERVAL = 600          # seconds between background age checks
+COPY_CHUNK = 1024 * 1024
+
+_lock = threading.Lock()
+_ready = False
+_total = 0                    # bytes on disk, kept in step with the objects table
+_evict_thread = None
+_warned = False
+_stats = {"stored": 0, "deduplicated": 0, "evicted": 0, "evicted_bytes": 0}
+
+
+def init_db():
+    global _ready, _total
+    if _ready:
+        return
+    with get_connection(DB_FILE) as conn:
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS objects (
+            sha256 TEXT PRIMARY KEY,
+            size INTEGER,
+            stored_size INTEGER,
+            codec TEXT,
+            refs INTEGER,
+            first_seen REAL,
+            last_seen REAL
+        );
+        """)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS uploads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sha256 TEXT,
+            filename TEXT,
+            uploaded_at REAL
+        );
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_objects_last_seen ON objects (last_seen);")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_uploads_sha256 ON uploads (sha256);")
+        total = conn.execute("SELECT COALESCE(SUM(stored_size), 0) FROM objects").fetchone()[0]
+    with _lock:
+        _total = total
+    _ready = True
+
+
+def _codec():
+    global _warned
+    if QUARANTINE_COMPRESS and zstandard is None:
+        if not _warned:
+            print("[Quarantine] quarantine_compress is on but zstandard is not installed; storing uncompressed")
+            _warned = True
+        return ""
+    return "zstd" if QUARANTINE_COMPRESS else ""
+
+
+def object_path(sha256, codec=""):
+    path = os.path.join(UPLOAD_FOLDER, sha256[:2], sha256)
+    return path + ".zst" if codec == "zstd" else path
+
+
+def _write_compressed(src, path):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            cctx = zstandard.ZstdCompressor(level=QUARANTINE_ZSTD_LEVEL)
+            cctx.copy_stream(src, out, read_size=COPY_CHUNK)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def _add_ref(conn, sha256, filename, now):
+    conn.execute("UPDATE objects SET refs = refs + 1, last_seen=? WHERE sha256=?", (now, sha256))
+    conn.execute("INSERT INTO uploads (sha256, filename, uploaded_at) VALUES (?, ?, ?)",
+                 (sha256, filename, now))
+
+
+def _existing(conn, sha256):
+    row = conn.execute("SELECT codec FROM objects WHERE sha256=?", (sha256,)).fetchone()
+    if row is not None and os.path.exists(object_path(sha256, row[0])):
+        return object_path(sha256, row[0])
+    return None
+
+
+def _record(sha256, filename, size, path, codec, hashes):
+    """Register a freshly written object and apply the size limit."""
+    global _total
+    now = time.time()
+    stored_size = os.path.getsize(path)
+    with get_connection(DB_FILE) as conn:
+        previous = conn.execute("SELECT stored_size FROM objects WHERE sha256=?", (sha256,)).fetchone()
+        conn.execute("""
+            INSERT INTO objects (sha256, size, stored_size, codec, refs, first_seen, last_seen)
+            VALUES (?, ?, ?, ?, 0, ?, ?)
+            ON CONFLICT(sha256) DO UPDATE SET size=excluded.size, stored_size=excluded.stored_size,
+                codec=excluded.codec
+        """, (sha256, size, stored_size, codec, now, now))
+        _add_ref(conn, sha256, filename, now)
+    if not codec:
+        # later scans of the stored copy skip hashing
+        try:
+            file_cache.store(os.stat(path), hashes)
+        except OSError:
+            pass
+    with _lock:
+        _total += stored_size - (previous[0] if previous else 0)
+        _stats["stored"] += 1
+        over = _total > QUARANTINE_MAX_BYTES
+    if over:
+        evict()
+
+
+def put(spool, hashes, filename):
+    """Keep an upload (a HashingSpool) under its sha256.
+
+    Returns (path, written); content that is already stored only gains a
+    reference and is not written again.
+    """
+    init_db()
+    sha256 = hashes["sha256"]
+    with get_connection(DB_FILE) as conn:
+        path = _existing(conn, sha256)
+        if path:
+            _add_ref(conn, sha256, filename, time.time())
+    if path:
+        with _lock:
+            _stats["deduplicated"] += 1
+        return path, False
+
+    codec = _codec()
+    path = object_path(sha256, codec)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if codec:
+        spool.seek(0)
+        _write_compressed(spool, path)
+    else:
+        spool.save_to(path)
+    _record(sha256, filename, spool.size, path, codec, hashes)
+    return path, True
+
+
+def put_file(src_path, filename=None, move=False):
+    """Keep an existing file (e.g. one left in uploads/ by older versions)."""
+    init_db()
+    hashes = compute_hashes(src_path)
+    sha256 = hashes["sha256"]
+    filename = filename or os.path.basename(src_path)
+    with get_connection(DB_FILE) as conn:
+        path = _existing(conn, sha256)
+        if path:
+            _add_ref(conn, sha256, filename, time.time())
+    if path:
+        with _lock:
+            _stats["deduplicated"] += 1
+        if move:
+            os.remove(src_path)
+        return path, False
+
+    codec = _codec()
+    path = object_path(sha256, codec)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    size = os.path.getsize(src_path)
+    if codec:
+        with open(src_path, "rb") as src:
+            _write_compressed(src, path)
+        if move:
+            os.remove(src_path)
+    elif move:
+        shutil.move(src_path, path)
+    else:
+        shutil.copyfile(src_path, path)
+    _record(sha256, filename, size, path, codec, hashes)
+    return path, True
+
+
+def open_object(sha256):
+    """Readable binary stream of a stored object's original bytes, or None."""
+    init_db()
+    row = get_connection(DB_FILE).execute("SELECT codec FROM objects WHERE sha256=?", (sha256,)).fetchone()
+    if row is None:
+        return None
+    path = object_path(sha256, row[0])
+    if not os.path.exists(path):
+        return None
+    if row[0] == "zstd":
+        if zstandard is None:
+            raise RuntimeError("object is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+
+def names(sha256):
+    """Filenames a payload was uploaded under, newest first."""
+    init_db()
+    rows = get_connection(DB_FILE).execute(
+        "SELECT filename, uploaded_at FROM uploads WHERE sha256=? ORDER BY id DESC", (sha256,)
+    ).fetchall()
+    return [{"filename": f, "uploaded_at": t} for f, t in rows]
+
+
+# -----------------------
+# Eviction
+# -----------------------
+def _remove(conn, sha256, codec):
+    path = object_path(sha256, codec)
+    if not codec:
+        file_cache.forget(path)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    conn.execute("DELETE FROM objects WHERE sha256=?", (sha256,))
+    conn.execute("DELETE FROM uploads WHERE sha256=?", (sha256,))
+
+
+def evict(max_bytes=None, max_age=None):
+    """Drop objects not uploaded within max_age seconds, then the least
+    recently uploaded ones until the store fits in max_bytes."""
+    global _total
+    init_db()
+    max_bytes = QUARANTINE_MAX_BYTES if max_bytes is None else max_bytes
+    max_age = QUARANTINE_MAX_AGE if max_age is None else max_age
+    evicted = freed = 0
+    with _lock:
+        with get_connection(DB_FILE) as conn:
+            rows = conn.execute(
+                "SELECT sha256, codec, stored_size FROM objects WHERE last_seen < ?",
+                (time.time() - max_age,),
+            ).fetchall()
+            total = conn.execute("SELECT COALESCE(SUM(stored_size), 0) FROM objects").fetchone()[0]
+            for sha256, codec, stored_size in rows:
+                _remove(conn, sha256, codec)
+                evicted += 1
+                freed += stored_size
+            total -= freed
+
+            if total > max_bytes:
+                for sha256, codec, stored_size in conn.execute(
+                    "SELECT sha256, codec, stored_size FROM objects ORDER BY last_seen"
+                ).fetchall():
+                    if total <= max_bytes:
+                        break
+                    _remove(conn, sha256, codec)
+                    evicted += 1
+                    freed += stored_size
+                    total -= stored_size
+        _total = total
+        _stats["evicted"] += evicted
+        _stats["evicted_bytes"] += freed
+    if evicted:
+        print(f"[Quarantine] Evicted {evicted} objects ({freed / (1024 * 1024):.1f} MB)")
+    return evicted
+
+
+def _evict_loop():
+    while True:
+        try:
+            evict()
+        except Exception as e:
+            print(f"[Quarantine] Eviction failed: {e}")
+        time.sleep(EVICT_INTERVAL)
+
+
+def start_evict_thread():
+    global _evict_thread
+    if _evict_thread is None:
+        _evict_thread = threading.Thread(target=_evict_loop, name="quarantine-evict", daemon=True)
+        _evict_thread.start()
+
+
+def stats():
+    init_db()
+    objects, refs, size = get_connection(DB_FILE).execute(
+        "SELECT COUNT(*), COALESCE(SUM(refs), 0), COALESCE(SUM(size), 0) FROM objects"
+    ).fetchone()
+    with _lock:
+        return dict(_stats, objects=objects, uploads=refs, original_bytes=size,
+                    stored_bytes=_total, max_bytes=QUARANTINE_MAX_BYTES,
+                    compression="zstd" if _codec() else "none")
+
+
+def import_legacy(folder=UPLOAD_FOLDER):
+    """Move files saved under their upload names into the store."""
+    imported = 0
+    for entry in os.scandir(folder):
+        if entry.is_file(follow_symlinks=False) and not entry.name.startswith("."):
+            put_file(entry.path, entry.name, move=True)
+            imported += 1
+    return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and maintain the upload quarantine store")
+    parser.add_argument("--import-legacy", action="store_true",
+                        help=f"move files saved by name in {UPLOAD_FOLDER}/ into the store")
+    parser.add_argument("--evict", action="store_true", help="apply the size and age limits now")
+    args = parser.parse_args()
+
+    if args.import_legacy:
+        print(f"[Quarantine] Imported {import_legacy()} files")
+    if args.evict:
+        evict()
+    print(f"[Quarantine] {stats()}")
+
+
+if __name__ == "__main__":
+    main()
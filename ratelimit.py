@@ -0,0 +1,78 @@
+# ratelimit.py
+# Token bucket shared by the outbound API clients (VirusTotal, notifiers).
+import heapq
+import itertools
+import threading
+import time
+
+PRIORITY_INTERACTIVE = 0      # a user is waiting on the page
+PRIORITY_BATCH = 5            # API batch requests
+PRIORITY_BACKGROUND = 10      # watcher / housekeeping work
+
+
+class TokenBucket:
+    """Blocking token bucket that hands out tokens in priority order.
+
+    `rate` tokens are added per second up to `capacity`. Waiters queue in a
+    heap ordered by (priority, arrival), and only the head of the queue may
+    take a token, so a lower priority number always goes first.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._seq = itertools.count()
+
+    def _refill(self, now):
+        start = max(self._updated, self._paused_until)
+        if now > start:
+            self._tokens = min(self.capacity, self._tokens + (now - start) * self.rate)
+        self._updated = max(self._updated, now)
+
+    def acquire(self, priority=PRIORITY_BACKGROUND, timeout=None):
+        """Block until a token is available for this caller. Returns False on timeout."""
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiters, ticket)
+            deadline = None if timeout is None else time.monotonic() + timeout
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    head = self._waiters[0] == ticket
+                    if head and self._tokens >= 1:
+                        self._tokens -= 1
+                        return True
+
+                    wait = None
+                    if head:
+                        if now < self._paused_until:
+                            wait = self._paused_until - now
+                        else:
+                            wait = (1 - self._tokens) / self.rate if self.rate > 0 else None
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            return False
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def pause(self, seconds):
+        """Hand out no tokens for `seconds` (e.g. after a 429 with Retry-After)."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+            self._cond.notify_all()
+
+    def pending(self):
+        with self._cond:
+            return len(self._waiters)
@@ -0,0 +1,247 @@
+# reports.py
+# PDF scan reports, rendered once per verdict and kept on disk.
+#
+# A report is cached under REPORTS_DIR by (key, last_scanned): a rescan
+# changes last_scanned and so gets a fresh report, and the stale one is
+# removed when the new one is written. Reports for new verdicts are
+# rendered by a background worker as scans complete, so downloads are
+# usually a file send. export_zip streams many reports as one ZIP without
+# holding them in memory.
+import hashlib
+import io
+import os
+import queue
+import re
+import tempfile
+import threading
+import zipfile
+
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import letter
+
+import history_db
+import verdict
+
+REPORTS_DIR = "reports"
+MAX_CACHED = 5000             # reports kept on disk, oldest evicted first
+PRUNE_EVERY = 100             # renders between cache prunes
+QUEUE_SIZE = 1000             # pending background renders; more are dropped
+EXPORT_MAX = 10000            # reports in one bulk export
+
+_queue = queue.Queue(maxsize=QUEUE_SIZE)
+_queued = set()
+_lock = threading.Lock()
+_worker = None
+_renders = 0
+_stats = {"rendered": 0, "cache_hits": 0, "background": 0, "dropped": 0, "exported": 0}
+
+
+def render_pdf(key, entry):
+    """PDF bytes for a history entry ({"result", "last_scanned"})."""
+    result = entry["result"]
+    date = entry["last_scanned"]
+
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer, pagesize=letter)
+
+    p.setFont("Helvetica-Bold", 16)
+    p.drawString(50, 750, "Cyber Security Analyzer - Scan Report")
+
+    p.setFont("Helvetica", 12)
+    p.drawString(50, 720, f"Key: {key}")
+    p.drawString(50, 700, f"Scanned: {date}")
+
+    summary = verdict.of(result)
+    p.drawString(50, 670, f"Summary: {summary.label.upper()}"
+                          + (f" ({summary.ratio} engines)" if summary.ratio else ""))
+    y = 650
+
+    for k, v in summary.counts.items():
+        p.drawString(70, y, f"{k.capitalize()}: {v}")
+        y -= 20
+
+    if summary.top:
+        p.drawString(50, y - 10, "Top Detections:")
+        y -= 30
+        for eng, category in summary.top:
+            p.drawString(70, y, f"{eng}: {category}")
+            y -= 20
+
+    p.drawString(50, y - 10, "Engine Results:")
+    y -= 40
+
+    engines = result.get("engines", {})
+    for eng, data in engines.items():
+        if y < 50:  # new page if space too small
+            p.showPage()
+            y = 750
+        p.drawString(70, y, f"{eng}: {data.get('result', 'unknown')}")
+        y -= 20
+
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
+
+
+# -----------------------
+# Cache
+# -----------------------
+def _key_id(key):
+    # keys are sha256s or URLs; hash them into safe, fixed-length names
+    return hashlib.sha1(key.encode()).hexdigest()
+
+def _stamp(last_scanned):
+    return re.sub(r"[^0-9]", "", last_scanned or "")
+
+def cached_path(key, last_scanned):
+    key_id = _key_id(key)
+    return os.path.join(REPORTS_DIR, key_id[:2], f"{key_id}-{_stamp(last_scanned)}.pdf")
+
+def report_name(key):
+    """Download/archive name for a key's report."""
+    return f"scan_report_{re.sub(r'[^A-Za-z0-9._-]+', '_', key)[:120]}.pdf"
+
+def get_pdf(key, entry):
+    """Absolute path of the report for entry, rendering and caching it if
+    needed (absolute because send_file resolves relative paths against the
+    app's root, not the working directory the cache lives under)."""
+    path = os.path.abspath(cached_path(key, entry["last_scanned"]))
+    if os.path.exists(path):
+        with _lock:
+            _stats["cache_hits"] += 1
+        return path
+
+    data = render_pdf(key, entry)
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=folder, suffix=".part")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+    # drop reports of earlier scans of the same key
+    prefix = os.path.basename(path).split("-")[0] + "-"
+    for name in os.listdir(folder):
+        if name.startswith(prefix) and name != os.path.basename(path) and name.endswith(".pdf"):
+            try:
+                os.remove(os.path.join(folder, name))
+            except OSError:
+                pass
+
+    global _renders
+    with _lock:
+        _stats["rendered"] += 1
+        _renders += 1
+        due = _renders % PRUNE_EVERY == 0
+    if due:
+        prune()
+    return path
+
+def prune(max_cached=MAX_CACHED):
+    """Remove the least recently written reports beyond max_cached."""
+    reports = []
+    for root, _, files in os.walk(REPORTS_DIR):
+        for name in files:
+            if name.endswith(".pdf"):
+                path = os.path.join(root, name)
+                try:
+                    reports.append((os.path.getmtime(path), path))
+                except OSError:
+                    pass
+    if len(reports) <= max_cached:
+        return 0
+    reports.sort()
+    for _, path in reports[:len(reports) - max_cached]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return len(reports) - max_cached
+
+
+# -----------------------
+# Background rendering
+# -----------------------
+def _run_worker():
+    while True:
+        key, key_type = _queue.get()
+        with _lock:
+            _queued.discard((key, key_type))
+        try:
+            entry = history_db.get_cached_result(key, key_type)
+            if entry:
+                get_pdf(key, entry)
+                with _lock:
+                    _stats["background"] += 1
+        except Exception as e:
+            print(f"[Reports] Rendering report for {key} failed: {e}")
+
+def _ensure_worker():
+    global _worker
+    with _lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_run_worker, name="report-renderer", daemon=True)
+            _worker.start()
+
+def schedule(key, key_type):
+    """Render key's report in the background (call when a scan completes)."""
+    _ensure_worker()
+    with _lock:
+        if (key, key_type) in _queued:
+            return
+        _queued.add((key, key_type))
+    try:
+        _queue.put_nowait((key, key_type))
+    except queue.Full:
+        with _lock:
+            _queued.discard((key, key_type))
+            _stats["dropped"] += 1
+
+
+# -----------------------
+# Bulk export
+# -----------------------
+class _ChunkSink(io.RawIOBase):
+    """Write-only, unseekable sink; zipfile then streams with data descriptors."""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def export_zip(entries):
+    """Yield a ZIP of reports for (key, key_type, entry) tuples, one report
+    at a time (rendered into the cache when missing)."""
+    sink = _ChunkSink()
+    names = set()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for key, key_type, entry in entries:
+            try:
+                path = get_pdf(key, entry)
+            except Exception as e:
+                print(f"[Reports] Skipping {key} in export: {e}")
+                continue
+            name = report_name(key)
+            if name in names:
+                name = f"{name[:-4]}_{_key_id(key)[:8]}.pdf"
+            names.add(name)
+            zf.write(path, arcname=name)
+            with _lock:
+                _stats["exported"] += 1
+            yield sink.drain()
+    yield sink.drain()
+
+def stats():
+    with _lock:
+        return dict(_stats, queued=len(_queued))
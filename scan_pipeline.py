@@ -0,0 +1,220 @@
+# scan_pipeline.py
+# Worker pool behind the watchers: observer threads only enqueue paths,
+# workers hash in parallel and hand the sha256 to the lookup coalescer.
+# Recording and notifying happen when the verdict arrives, so a worker
+# never waits on VT: files with a known verdict are not held up behind
+# unknown ones, and a burst of files reaches the coalescer as one batch.
+#
+# The queue is bounded. When it is full, submit() blocks the observer for
+# up to SCAN_PUT_TIMEOUT seconds (backpressure) and then refuses the path
+# (the readiness tracker offers it again later); both are counted in stats().
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from config import SCAN_WORKERS, SCAN_QUEUE_SIZE, SCAN_POOL, SCAN_PUT_TIMEOUT
+import file_cache
+from hashing import compute_hashes
+from hash_lookup import get_coalescer
+from event_store import add_event
+from logger import log_event
+from notifier import notify
+
+_STOP = object()
+
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+
+_awaiting = 0             # files handed to the coalescer, not yet recorded
+_awaiting_cond = threading.Condition()
+
+
+def _get_hash_pool():
+    """Shared executor for hashing: processes or threads per SCAN_POOL."""
+    global _hash_pool
+    if _hash_pool is None:
+        with _hash_pool_lock:
+            if _hash_pool is None:
+                if SCAN_POOL == "process":
+                    _hash_pool = ProcessPoolExecutor(max_workers=SCAN_WORKERS)
+                else:
+                    _hash_pool = ThreadPoolExecutor(max_workers=SCAN_WORKERS, thread_name_prefix="hash")
+    return _hash_pool
+
+
+def _hash_on_pool(path):
+    return _get_hash_pool().submit(compute_hashes, path).result()
+
+
+def hash_file(path):
+    """Hashes for path: from the file-identity cache if the file is unchanged,
+    otherwise compute_hashes on the shared pool, so concurrent scans never
+    oversubscribe the CPU."""
+    return file_cache.cached_hashes(path, _hash_on_pool)
+
+
+def process_file(path, event_type="watchdog_file_created"):
+    """Hash a file and look up its verdict; it is recorded and notified
+    once the verdict arrives. Returns (hashes, Future of the verdict)."""
+    global _awaiting
+    hashes = hash_file(path)
+    future = get_coalescer().lookup(hashes["sha256"])
+    with _awaiting_cond:
+        _awaiting += 1
+    future.add_done_callback(lambda f: _record(path, hashes, f.result(), event_type))
+    return hashes, future
+
+
+def _record(path, hashes, vt_result, event_type):
+    # runs on whichever thread resolved the lookup (the old on_created tail)
+    global _awaiting
+    try:
+        add_event(
+            event_type="file_created",
+            file_path=path,
+            hashes=hashes,
+            vt_result=vt_result,
+        )
+        log_event(
+            event_type=event_type,
+            file_path=path,
+            hashes=hashes,
+            vt_result=vt_result
+        )
+        notify(
+            event_type=event_type,
+            file_path=path,
+            hashes=hashes,
+            vt_result=vt_result
+        )
+    except Exception as e:
+        print(f"[Pipeline] Failed to record {path}: {e}")
+    finally:
+        with _awaiting_cond:
+            _awaiting -= 1
+            _awaiting_cond.notify_all()
+
+
+def awaiting_verdicts():
+    with _awaiting_cond:
+        return _awaiting
+
+
+def wait_for_verdicts(timeout=None):
+    """Block until every file passed to process_file has been recorded.
+    Returns False if timeout ran out first."""
+    with _awaiting_cond:
+        return _awaiting_cond.wait_for(lambda: _awaiting == 0, timeout)
+
+
+class ScanPipeline:
+    def __init__(self, workers=SCAN_WORKERS, queue_size=SCAN_QUEUE_SIZE,
+                 put_timeout=SCAN_PUT_TIMEOUT, prepare=None, handler=process_file):
+        """prepare(path) runs on the worker before handler(path), e.g. to
+        wait for the file to be fully written; returning False skips it."""
+        self.workers = workers
+        self.put_timeout = put_timeout
+        self.prepare = prepare
+        self.handler = handler
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._accepting = False
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._counters = {
+            "submitted": 0, "processed": 0, "failed": 0, "skipped": 0,
+            "dropped": 0, "blocked_puts": 0, "blocked_seconds": 0.0, "max_depth": 0,
+        }
+
+    def start(self):
+        self._accepting = True
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"scan-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def submit(self, path):
+        """Enqueue a path. Returns False if the pipeline is stopped or the queue stayed full."""
+        if not self._accepting:
+            return False
+        try:
+            self._queue.put_nowait(path)
+        except queue.Full:
+            start = time.monotonic()
+            try:
+                self._queue.put(path, timeout=self.put_timeout)
+            except queue.Full:
+                with self._lock:
+                    self._counters["dropped"] += 1
+                print(f"[Pipeline] Queue full, not accepting {path} for now")
+                return False
+            finally:
+                with self._lock:
+                    self._counters["blocked_puts"] += 1
+                    self._counters["blocked_seconds"] += time.monotonic() - start
+
+        with self._lock:
+            self._counters["submitted"] += 1
+            self._counters["max_depth"] = max(self._counters["max_depth"], self._queue.qsize())
+        return True
+
+    def _work(self):
+        while True:
+            path = self._queue.get()
+            if path is _STOP:
+                self._queue.task_done()
+                return
+            with self._lock:
+                self._in_flight += 1
+            outcome = "processed"
+            try:
+                if self.prepare is not None and self.prepare(path) is False:
+                    outcome = "skipped"
+                else:
+                    self.handler(path)
+            except Exception as e:
+                outcome = "failed"
+                print(f"[Pipeline] Failed to scan {path}: {e}")
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                    self._counters[outcome] += 1
+                self._queue.task_done()
+
+    def stop(self, drain=True, timeout=None):
+        """Stop accepting work; with drain=True finish everything already queued."""
+        self._accepting = False
+        if not drain:
+            try:
+                while True:
+                    self._queue.get_nowait()
+                    self._queue.task_done()
+            except queue.Empty:
+                pass
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for t in self._threads:
+            t.join(None if deadline is None else max(0, deadline - time.monotonic()))
+        self._threads = [t for t in self._threads if t.is_alive()]
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self._counters,
+                queue_depth=self._queue.qsize(),
+                queue_capacity=self._queue.maxsize,
+                in_flight=self._in_flight,
+                awaiting_verdict=awaiting_verdicts(),
+                workers=self.workers,
+            )
+
+
+def shutdown_hash_pool():
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is not None:
+            _hash_pool.shutdown(wait=True)
+            _hash_pool = None
@@ -0,0 +1,121 @@
+# signature_index.py
+# Compact in-memory set of known-bad sha256 digests.
+#
+# Digests live in one sorted bytes blob (32 bytes each, no per-item
+# object overhead) behind a bloom filter, so the common case - a clean
+# file - is answered from a few bit tests without a search or disk I/O.
+# Memory is ~33.2 bytes per hash: 1M hashes ~ 33 MB.
+import struct
+import threading
+
+DIGEST_SIZE = 32
+BLOOM_BITS_PER_ITEM = 10      # ~1% false positives with BLOOM_HASHES
+BLOOM_HASHES = 7              # 7 x 4-byte slices of the digest
+HEADROOM = 0.25               # spare bloom capacity for live additions
+
+_slices = struct.Struct("<%dI" % BLOOM_HASHES)
+
+
+class BloomFilter:
+    """Bloom filter over sha256 digests.
+
+    The input is already a uniformly distributed hash, so the k bit
+    positions are simply taken from consecutive 4-byte slices of it.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = max(int(capacity), 1024)
+        self.size = self.capacity * BLOOM_BITS_PER_ITEM
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def add(self, digest):
+        bits, size = self.bits, self.size
+        for h in _slices.unpack_from(digest):
+            pos = h % size
+            bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, digest):
+        bits, size = self.bits, self.size
+        for h in _slices.unpack_from(digest):
+            pos = h % size
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+
+class SignatureIndex:
+    """Exact membership test for sha256 digests (bytes of length 32)."""
+
+    def __init__(self, sorted_blob=b""):
+        self.count = len(sorted_blob) // DIGEST_SIZE
+        self._blob = bytes(sorted_blob)
+        self._added = set()   # digests added since the blob was built
+        self._lock = threading.Lock()
+        self._bloom = BloomFilter(self.count * (1 + HEADROOM))
+        for i in range(0, len(self._blob), DIGEST_SIZE):
+            self._bloom.add(self._blob[i:i + DIGEST_SIZE])
+
+    @classmethod
+    def from_hex(cls, hex_digests):
+        """Build from an iterable of hex strings. Sorted input is packed
+        directly; anything out of order falls back to a sort."""
+        blob = bytearray()
+        last = b""
+        ordered = True
+        for h in hex_digests:
+            try:
+                d = bytes.fromhex(h)
+            except (TypeError, ValueError):
+                continue
+            if len(d) != DIGEST_SIZE:
+                continue
+            if d < last:
+                ordered = False
+            last = d
+            blob += d
+
+        if not ordered:
+            blob = bytes(blob)
+            digests = sorted(set(blob[i:i + DIGEST_SIZE] for i in range(0, len(blob), DIGEST_SIZE)))
+            blob = b"".join(digests)
+        return cls(blob)
+
+    def _in_blob(self, digest):
+        blob = self._blob
+        lo, hi = 0, len(blob) // DIGEST_SIZE
+        while lo < hi:
+            mid = (lo + hi) // 2
+            cur = blob[mid * DIGEST_SIZE:(mid + 1) * DIGEST_SIZE]
+            if cur < digest:
+                lo = mid + 1
+            elif cur > digest:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def __contains__(self, digest):
+        if digest not in self._bloom:
+            return False
+        if self._in_blob(digest):
+            return True
+        with self._lock:
+            return digest in self._added
+
+    def add(self, digest):
+        if digest in self:
+            return
+        with self._lock:
+            self._added.add(digest)
+            self._bloom.add(digest)
+            self.count += 1
+
+    def needs_rebuild(self):
+        """True once live additions exhaust the bloom filter's headroom."""
+        return self.count > self._bloom.capacity
+
+    def __len__(self):
+        return self.count
+
+    def memory_bytes(self):
+        return len(self._blob) + len(self._bloom.bits) + len(self._added) * DIGEST_SIZE
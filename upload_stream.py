@@ -0,0 +1,119 @@
+# upload_stream.py
+# Uploads are hashed while werkzeug parses the request body: every chunk
+# goes through a StreamHasher on its way into a spool (memory first, a temp
+# file in UPLOAD_FOLDER past UPLOAD_SPOOL_MEMORY). By the time the view
+# runs the hashes are known, so the file is only written out (by
+# quarantine_store) when it is actually kept, and never twice.
+import io
+import os
+import tempfile
+
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from config import UPLOAD_FOLDER, UPLOAD_MAX_BYTES, UPLOAD_SPOOL_MEMORY
+from hashing import StreamHasher
+
+INCOMING_DIR = os.path.join(UPLOAD_FOLDER, ".incoming")
+
+
+class HashingSpool(io.RawIOBase):
+    """Writable file object that hashes everything written to it."""
+
+    def __init__(self, directory=INCOMING_DIR, max_memory=UPLOAD_SPOOL_MEMORY, max_bytes=UPLOAD_MAX_BYTES):
+        super().__init__()
+        self.directory = directory
+        self.max_memory = max_memory
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._hasher = StreamHasher()
+        self._hashes = None
+        self._buf = io.BytesIO()
+        self._file = None
+        self._path = None
+
+    @property
+    def _target(self):
+        return self._file if self._file is not None else self._buf
+
+    def writable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def write(self, data):
+        view = memoryview(data)
+        self.size += len(view)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise RequestEntityTooLarge()
+        self._hasher.update(view)
+        if self._file is None and self.size > self.max_memory:
+            self._rollover()
+        return self._target.write(view)
+
+    def _rollover(self):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, self._path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        self._file = os.fdopen(fd, "w+b")
+        self._file.write(self._buf.getbuffer())
+        self._buf = None
+
+    def read(self, size=-1):
+        return self._target.read(size)
+
+    def readinto(self, b):
+        return self._target.readinto(b)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._target.seek(offset, whence)
+
+    def tell(self):
+        return self._target.tell()
+
+    def hexdigests(self):
+        """Hashes of everything written so far (final once the upload is parsed)."""
+        if self._hashes is None:
+            self._hashes = self._hasher.hexdigests()
+        return self._hashes
+
+    @property
+    def on_disk(self):
+        return self._file is not None
+
+    def save_to(self, path):
+        """Move the spooled data to path: a rename if it spilled to disk."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            os.replace(self._path, path)
+            self._path = None
+        else:
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".part")
+            with os.fdopen(fd, "wb") as f:
+                f.write(self._buf.getbuffer())
+            os.replace(tmp, path)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._path is not None:
+            try:
+                os.remove(self._path)
+            except OSError:
+                pass
+            self._path = None
+        self._buf = None
+        super().close()
+
+
+class HashingRequest(Request):
+    """Request class that gives every uploaded file a HashingSpool."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingSpool()
+
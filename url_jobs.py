@@ -0,0 +1,263 @@
+# url_jobs.py
+# Background URL scans: /check_url submits a job and returns at once, a
+# single scheduler thread polls every pending VT analysis with per-job
+# exponential backoff, and finished verdicts land in history_db.
+#
+# Due steps wait in a ready queue ordered by job priority, and VT_WORKERS
+# threads take the most urgent one. One worker is kept for interactive
+# steps, so a full batch backlog (whose steps sit in the rate limiter)
+# never stands between /check_url and the next VT token.
+import heapq
+import itertools
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+import history_db
+import reports
+from logger import log_event
+from notifier import notify
+from ratelimit import PRIORITY_INTERACTIVE
+from vt import get_client, normalize_analysis, summarize_engines
+
+POLL_INITIAL = 2.0        # first poll this long after submission
+POLL_MAX = 60.0           # backoff cap between polls of one analysis
+POLL_FACTOR = 2.0
+JOB_TIMEOUT = 600         # give up on an analysis after this many seconds
+JOB_RETENTION = 3600      # keep finished jobs around for the result page
+VT_WORKERS = 4            # concurrent VT calls (the quota is the real limit)
+BACKGROUND_WORKERS = VT_WORKERS - 1   # of those, busy with batch/background steps at most
+
+_jobs = {}                # job_id -> job dict
+_pending_by_url = {}      # url -> job_id, so repeated submits share one job
+_schedule = []            # heap of (due, seq, job_id)
+_ready = []               # heap of (priority, seq, job_id), due steps awaiting a worker
+_seq = itertools.count()
+_cond = threading.Condition()
+_busy_background = 0      # workers running a non-interactive step
+_scheduler = None
+
+
+def _public(job):
+    return {
+        "id": job["id"],
+        "url": job["url"],
+        "status": job["status"],
+        "created": job["created"],
+        "polls": job["polls"],
+    }
+
+
+def _schedule_at(job_id, due):
+    heapq.heappush(_schedule, (due, next(_seq), job_id))
+    _cond.notify_all()
+
+
+def _make_ready(job):
+    # a job has at most one live ready entry (job["ready"] holds its seq);
+    # re-queuing it, e.g. at a higher priority, leaves the old one stale
+    seq = next(_seq)
+    job["ready"] = seq
+    heapq.heappush(_ready, (job["priority"], seq, job["id"]))
+    _cond.notify_all()
+
+
+def _ensure_started():
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = threading.Thread(target=_run_scheduler, name="url-scan-scheduler", daemon=True)
+        _scheduler.start()
+        for i in range(VT_WORKERS):
+            threading.Thread(target=_run_worker, name=f"vt-url-{i}", daemon=True).start()
+
+
+def submit(url, priority=PRIORITY_INTERACTIVE):
+    """Queue a URL scan and return its job id."""
+    with _cond:
+        existing = _pending_by_url.get(url)
+        if existing:
+            # a more urgent caller speeds up the shared job
+            job = _jobs[existing]
+            if priority < job["priority"]:
+                job["priority"] = priority
+                if job["ready"] is not None:
+                    _make_ready(job)
+            return existing
+
+        _ensure_started()
+        job_id = uuid.uuid4().hex
+        _jobs[job_id] = {
+            "id": job_id,
+            "url": url,
+            "status": "queued",          # queued -> submitted -> completed | failed
+            "analysis_id": None,
+            "created": time.time(),
+            "finished": None,
+            "delay": POLL_INITIAL,
+            "polls": 0,
+            "priority": priority,
+            "ready": None,               # seq of the job's entry in _ready
+            "result": None,
+            "waiters": [],               # Futures from watch()
+        }
+        _pending_by_url[url] = job_id
+        _schedule_at(job_id, time.monotonic())
+        return job_id
+
+
+def get_job(job_id):
+    """Public view of a job (no result payload), or None."""
+    with _cond:
+        job = _jobs.get(job_id)
+        return _public(job) if job else None
+
+
+def get_result(job_id):
+    """(status, normalized result) for a job; result is None until finished."""
+    with _cond:
+        job = _jobs.get(job_id)
+        if not job:
+            return None, None
+        return job["status"], job["result"]
+
+
+def watch(job_id):
+    """Future resolving to (status, normalized result) when the job finishes;
+    None for an unknown job."""
+    future = Future()
+    with _cond:
+        job = _jobs.get(job_id)
+        if not job:
+            return None
+        if job["finished"] is None:
+            job["waiters"].append(future)
+            return future
+    future.set_result((job["status"], job["result"]))
+    return future
+
+
+def _finish(job, status, engines):
+    normalized = summarize_engines(engines)
+    with _cond:
+        job["status"] = status
+        job["result"] = normalized
+        job["finished"] = time.time()
+        _pending_by_url.pop(job["url"], None)
+        waiters, job["waiters"] = job["waiters"], []
+    for future in waiters:
+        future.set_result((status, normalized))
+
+    if status == "completed":
+        history_db.add_or_update_cache(job["url"], "url", normalized)
+        if normalized["engines"]:
+            reports.schedule(job["url"], "url")
+    log_event(event_type="manual_url_scan", url=job["url"], vt_result=normalized)
+    notify(event_type="manual_url_scan", url=job["url"], vt_result=normalized)
+
+
+def _step(job_id):
+    """One VT call for a job: submit it, or poll its analysis once."""
+    with _cond:
+        job = _jobs.get(job_id)
+    if job is None:
+        return
+
+    client = get_client()
+    try:
+        if job["analysis_id"] is None:
+            analysis_id = client.submit_url(job["url"], job["priority"])
+            if not analysis_id:
+                _finish(job, "failed", {})
+                return
+            with _cond:
+                job["analysis_id"] = analysis_id
+                job["status"] = "submitted"
+                _schedule_at(job_id, time.monotonic() + job["delay"])
+            return
+
+        data = client.get_analysis(job["analysis_id"], job["priority"])
+        attrs = data.get("data", {}).get("attributes", {})
+        with _cond:
+            job["polls"] += 1
+
+        if attrs.get("status") == "completed":
+            _finish(job, "completed", normalize_analysis(attrs.get("results", {})))
+            return
+
+        if time.time() - job["created"] > JOB_TIMEOUT:
+            print(f"[URLJobs] Analysis for {job['url']} timed out")
+            _finish(job, "failed", {})
+            return
+
+        with _cond:
+            job["delay"] = min(job["delay"] * POLL_FACTOR, POLL_MAX)
+            _schedule_at(job_id, time.monotonic() + job["delay"])
+    except Exception as e:
+        print(f"[URLJobs] Job {job_id} failed: {e}")
+        _finish(job, "failed", {})
+
+
+def _expire_finished(now):
+    for job_id in [j for j, job in _jobs.items()
+                   if job["finished"] and now - job["finished"] > JOB_RETENTION]:
+        del _jobs[job_id]
+
+
+def _run_scheduler():
+    while True:
+        with _cond:
+            while not _schedule or _schedule[0][0] > time.monotonic():
+                timeout = _schedule[0][0] - time.monotonic() if _schedule else None
+                _cond.wait(timeout)
+            _, _, job_id = heapq.heappop(_schedule)
+            _expire_finished(time.time())
+            job = _jobs.get(job_id)
+            if job is not None:
+                _make_ready(job)
+
+
+def _next_step():
+    # most urgent live ready entry this worker may take; None to keep waiting
+    while _ready:
+        priority, seq, job_id = _ready[0]
+        job = _jobs.get(job_id)
+        if job is None or job["ready"] != seq:
+            heapq.heappop(_ready)
+            continue
+        if priority > PRIORITY_INTERACTIVE and _busy_background >= BACKGROUND_WORKERS:
+            return None
+        heapq.heappop(_ready)
+        job["ready"] = None
+        return priority, job_id
+    return None
+
+
+def _run_worker():
+    global _busy_background
+    while True:
+        with _cond:
+            step = _next_step()
+            while step is None:
+                _cond.wait()
+                step = _next_step()
+            priority, job_id = step
+            background = priority > PRIORITY_INTERACTIVE
+            if background:
+                _busy_background += 1
+        try:
+            _step(job_id)
+        finally:
+            if background:
+                with _cond:
+                    _busy_background -= 1
+                    _cond.notify_all()
+
+
+def stats():
+    with _cond:
+        by_status = {}
+        for job in _jobs.values():
+            by_status[job["status"]] = by_status.get(job["status"], 0) + 1
+        return {"jobs": len(_jobs), "scheduled": len(_schedule), "ready": len(_ready),
+                "by_status": by_status}
@@ -0,0 +1,97 @@
+# verdict.py
+# One summary per scan result, computed when the result is produced and
+# stored with it (result["verdict"]), so pages, reports and alerts read
+# counts, label and top detections without walking the engine table.
+#
+# A normalized result looks like
+#   {"counts": {...}, "engines": {...}, "verdict": {"engine_count": .., "top": [[engine, category], ..]}}
+# Results stored before verdicts existed are summarized on first use.
+from collections import namedtuple
+
+COUNT_KEYS = ("malicious", "suspicious", "clean", "harmless")
+TOP_DETECTIONS = 5
+
+_RANK = {"malicious": 0, "suspicious": 1}
+
+
+class Verdict(namedtuple("Verdict", COUNT_KEYS + ("engine_count", "top"))):
+    """Immutable summary of a scan result. top is a tuple of
+    (engine, category) pairs, malicious before suspicious."""
+    __slots__ = ()
+
+    @property
+    def counts(self):
+        return {k: getattr(self, k) for k in COUNT_KEYS}
+
+    @property
+    def detections(self):
+        return self.malicious + self.suspicious
+
+    @property
+    def ratio(self):
+        """Detections over engines, e.g. "3/70"; None without engine results."""
+        return f"{self.detections}/{self.engine_count}" if self.engine_count else None
+
+    @property
+    def label(self):
+        if self.malicious:
+            return "malicious"
+        if self.suspicious:
+            return "suspicious"
+        if self.engine_count or self.clean or self.harmless:
+            return "clean"
+        return "unknown"
+
+    def to_dict(self):
+        # counts are stored in the result's own "counts"
+        return {"engine_count": self.engine_count, "top": [list(t) for t in self.top]}
+
+
+def _category(info):
+    return (info.get("result") or info.get("category") or "clean").lower()
+
+
+def from_engines(engines, counts=None):
+    """Verdict for a normalized engine table; counts (e.g. VT's own stats)
+    take precedence over counting the table."""
+    engines = engines or {}
+    detected = []
+    derived = dict.fromkeys(COUNT_KEYS, 0)
+    for engine, info in engines.items():
+        category = _category(info)
+        if category in _RANK:
+            detected.append((_RANK[category], info.get("engine_name") or engine, category))
+        derived[category if category in derived else "clean"] += 1
+    detected.sort()
+    if counts is None:
+        counts = derived
+    return Verdict(
+        *(int(counts.get(k) or 0) for k in COUNT_KEYS),
+        engine_count=len(engines),
+        top=tuple((engine, category) for _, engine, category in detected[:TOP_DETECTIONS]),
+    )
+
+
+def attach(result):
+    """Add the stored summary to a normalized result (in place) and return it."""
+    result["verdict"] = from_engines(result.get("engines"), result.get("counts")).to_dict()
+    return result
+
+
+def of(result):
+    """Verdict for a normalized result, from its stored summary when present."""
+    if not result:
+        return from_engines({}, {})
+    stored = result.get("verdict")
+    counts = result.get("counts")
+    if stored is None or counts is None:
+        verdict = from_engines(result.get("engines"), counts)
+        if counts is not None:
+            # summarize legacy results once; cached entries keep it
+            result["verdict"] = verdict.to_dict()
+        return verdict
+    return Verdict(
+        *(int(counts.get(k) or 0) for k in COUNT_KEYS),
+        engine_count=stored["engine_count"],
+        top=tuple(tuple(t) for t in stored["top"]),
+    )
@@ -1,9 +1,15 @@
 # vt.py
 import time
+import threading
 import requests
 import json
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+from requests.adapters import HTTPAdapter
+
+from ratelimit import TokenBucket, PRIORITY_INTERACTIVE
+import verdict
 
 # prefer a config.py VT_API_KEY, fallback to settings.json if present
 try:
@@ -11,8 +17,14 @@ try:
 except Exception:
     CONFIG_VT_KEY = ""
 
+from config import VT_BASE_URL, VT_RATE_PER_MIN, VT_MAX_RETRIES, VT_INTERACTIVE_RETRIES
+
 SETTINGS_FILE = "settings.json"
 
+# get_file_report's answer for a hash VT has no record of (HTTP 404). It
+# normalizes to an empty, negative verdict; a failed request is None.
+NOT_FOUND = {"data": {}}
+
 def get_vt_api_key():
     # config takes precedence
     if CONFIG_VT_KEY:
@@ -27,74 +39,173 @@ def get_vt_api_key():
             pass
     return ""
 
-def check_url_virustotal(url: str, poll_interval: float = 1.0) -> Dict[str, Any]:
-    """
-    Submit URL to VT and wait for analysis completion.
-    Returns normalized engine table: { engine_name: { "category": "...", "engine_name": "..." }, ... }
-    If error occurs, returns {}.
+
+class VTClient:
+    """VirusTotal v3 client sharing one pooled Session and one quota.
+
+    Every HTTP call first takes a token from a priority-ordered token
+    bucket sized to the account's per-minute quota, so interactive scans
+    are served before queued watcher work. 429 responses pause the whole
+    bucket (honouring Retry-After); 429/5xx and network errors are retried
+    with exponential backoff, fewer times when a user is waiting.
     """
-    api_key = get_vt_api_key()
-    if not api_key:
-        return {}
 
-    submit_ep = "https://www.virustotal.com/api/v3/urls"
-    headers = {"x-apikey": api_key}
+    def __init__(self, api_key=None, base_url=VT_BASE_URL, rate_per_min=VT_RATE_PER_MIN,
+                 max_retries=VT_MAX_RETRIES, interactive_retries=VT_INTERACTIVE_RETRIES,
+                 backoff=2.0, timeout=15, connect_timeout=5, pool_size=10):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.interactive_retries = interactive_retries
+        self.backoff = backoff
+        self.timeout = (connect_timeout, timeout)
+        self.limiter = TokenBucket(rate_per_min / 60.0, capacity=1)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
 
-    try:
-        resp = requests.post(submit_ep, data={"url": url}, headers=headers, timeout=15)
-    except Exception:
-        return {}
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0, "errors": 0}
+        self._stats_lock = threading.Lock()
 
-    if resp.status_code not in (200, 201):
-        return {}
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
 
-    data = resp.json()
-    analysis_id = data.get("data", {}).get("id")
-    if not analysis_id:
-        return {}
+    def _request(self, method, path, priority, **kwargs) -> Optional[requests.Response]:
+        api_key = self.api_key or get_vt_api_key()
+        if not api_key:
+            return None
 
-    result_ep = f"https://www.virustotal.com/api/v3/analyses/{analysis_id}"
+        url = f"{self.base_url}{path}"
+        headers = {"x-apikey": api_key}
 
-    # poll until 'completed' or until timeout cycles
-    for _ in range(120):  # 120 * 1s = 2 minutes max
+        retries = self.max_retries
+        if priority <= PRIORITY_INTERACTIVE:
+            retries = min(retries, self.interactive_retries)
+
+        for attempt in range(retries + 1):
+            if attempt:
+                self._count("retries")
+            last = attempt == retries
+            delay = self.backoff * (2 ** attempt)
+
+            self.limiter.acquire(priority)
+            self._count("requests")
+            try:
+                resp = self.session.request(method, url, headers=headers, timeout=self.timeout, **kwargs)
+            except requests.RequestException as e:
+                print(f"[VT] {method} {path} failed: {e}")
+                if not last:
+                    time.sleep(delay)
+                continue
+
+            if resp.status_code == 429:
+                self._count("rate_limited")
+                try:
+                    delay = max(delay, float(resp.headers.get("Retry-After", 0)))
+                except ValueError:
+                    pass
+                print(f"[VT] Quota exceeded, pausing {delay:.0f}s")
+                self.limiter.pause(delay)
+                continue
+            if resp.status_code >= 500:
+                print(f"[VT] {method} {path} HTTP {resp.status_code}"
+                      + ("" if last else ", retrying"))
+                if not last:
+                    time.sleep(delay)
+                continue
+            return resp
+
+        self._count("errors")
+        return None
+
+    # -----------------------
+    # Endpoints
+    # -----------------------
+    def get_file_report(self, file_hash, priority=PRIORITY_INTERACTIVE) -> Optional[Dict[str, Any]]:
+        """Raw /files/<hash> JSON, NOT_FOUND if unknown to VT, or None on error."""
+        resp = self._request("GET", f"/files/{file_hash}", priority)
+        if resp is None:
+            return None
+        if resp.status_code == 404:
+            return NOT_FOUND
+        if resp.status_code != 200:
+            print(f"[VT] GET /files/{file_hash} HTTP {resp.status_code}")
+            return None
         try:
-            r = requests.get(result_ep, headers=headers, timeout=15)
-            d = r.json()
-        except Exception:
-            time.sleep(poll_interval)
-            continue
-
-        status = d.get("data", {}).get("attributes", {}).get("status", "")
-        if status == "completed":
-            results = d.get("data", {}).get("attributes", {}).get("results", {})
-            # normalize to engine table
-            engines = {}
-            for eng, info in results.items():
-                category = info.get("category") or info.get("result") or "clean"
-                engines[eng] = {
-                    "result": category,
-                    "engine_name": info.get("engine_name", eng)
-                }
-            return engines
-        time.sleep(poll_interval)
-
-    return {}
-
-def check_filehash_virustotal(file_hash: str) -> Dict[str, Any]:
+            return resp.json()
+        except ValueError:
+            return None
+
+    def submit_url(self, url, priority=PRIORITY_INTERACTIVE) -> Optional[str]:
+        """Submit a URL for analysis. Returns the analysis id, or None."""
+        resp = self._request("POST", "/urls", priority, data={"url": url})
+        if resp is None or resp.status_code not in (200, 201):
+            return None
+        try:
+            return resp.json().get("data", {}).get("id")
+        except ValueError:
+            return None
+
+    def get_analysis(self, analysis_id, priority=PRIORITY_INTERACTIVE) -> Dict[str, Any]:
+        resp = self._request("GET", f"/analyses/{analysis_id}", priority)
+        if resp is None or resp.status_code != 200:
+            return {}
+        try:
+            return resp.json()
+        except ValueError:
+            return {}
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client() -> VTClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = VTClient()
+    return _client
+
+
+def normalize_analysis(results: Dict[str, Any]) -> Dict[str, Any]:
+    """Analysis/report results -> { engine_name: { "result": "...", "engine_name": "..." }, ... }"""
+    engines = {}
+    for eng, info in (results or {}).items():
+        category = info.get("category") or info.get("result") or "clean"
+        engines[eng] = {
+            "result": category,
+            "engine_name": info.get("engine_name", eng)
+        }
+    return engines
+
+def summarize_engines(engines: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalized engine table -> { "counts": {...}, "engines": {...} } as stored in history_db."""
+    # one pass: the verdict's counts are the engine tally
+    summary = verdict.from_engines(engines)
+    return {"counts": summary.counts, "engines": engines or {}, "verdict": summary.to_dict()}
+
+def normalize_file_report(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Raw /files/<hash> JSON -> { "counts": {...}, "engines": {...} } as stored in history_db."""
+    attributes = (raw or {}).get("data", {}).get("attributes", {})
+    stats = attributes.get("last_analysis_stats", {})
+    counts = {
+        "malicious": stats.get("malicious", 0),
+        "suspicious": stats.get("suspicious", 0),
+        "clean": stats.get("undetected", 0),
+        "harmless": stats.get("harmless", 0)
+    }
+    return verdict.attach({"counts": counts, "engines": normalize_analysis(attributes.get("last_analysis_results", {}))})
+
+def check_filehash_virustotal(file_hash: str, priority: int = PRIORITY_INTERACTIVE) -> Optional[Dict[str, Any]]:
     """
-    Query VT files endpoint for the hash. Returns raw JSON response (dict).
-    If there's an error or not found, returns {}.
+    Query VT files endpoint for the hash. Returns raw JSON response (dict),
+    NOT_FOUND if VT has no record of it, or None on error.
     """
-    api_key = get_vt_api_key()
-    if not api_key:
-        return {}
-
-    ep = f"https://www.virustotal.com/api/v3/files/{file_hash}"
-    headers = {"x-apikey": api_key}
-    try:
-        resp = requests.get(ep, headers=headers, timeout=15)
-        if resp.status_code != 200:
-            return {}
-        return resp.json()
-    except Exception:
-        return {}
+    return get_client().get_file_report(file_hash, priority)
@@ -4,16 +4,20 @@ import os
 
 SETTINGS_FILE = "settings.json"
 
-def load_watch_folders():
+def load_watch_settings():
+    """Current folder list and recursive flag, read fresh from settings.json."""
     if not os.path.exists(SETTINGS_FILE):
-        return []
+        return {"folders": [], "recursive": False}
 
     data = json.load(open(SETTINGS_FILE, "r"))
 
     # Convert textarea into list
-    raw = data.get("watchdog_folders", "")
+    raw = data.get("watchdog_folders", "") or ""
     folders = [f.strip() for f in raw.split("\n") if f.strip()]
 
-    return folders
+    return {"folders": folders, "recursive": data.get("watch_recursive", "no") == "yes"}
+
+def load_watch_folders():
+    return load_watch_settings()["folders"]
 
 WATCH_FOLDERS = load_watch_folders()
@@ -0,0 +1,263 @@
+# watcher_service.py
+# The folder watcher: one watchdog Observer with a scheduled watch per
+# folder, one readiness tracker and one scan pipeline shared by all of
+# them. settings.json is re-read when it changes, and watches are added or
+# removed without a restart. A status snapshot is written to
+# WATCHER_STATUS_FILE for the web app (/api/watcher/status).
+#
+#   python watcher_service.py
+import json
+import os
+import threading
+import time
+
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+
+import local_db
+import history_db
+import file_cache
+from baseline import start_baseline
+from config import BASELINE_SCAN, WATCHER_STATUS_FILE, WATCHER_STATUS_INTERVAL
+from file_ready import ReadinessTracker
+from hash_lookup import get_coalescer
+from scan_pipeline import ScanPipeline, shutdown_hash_pool, wait_for_verdicts
+from watcher_config import SETTINGS_FILE, load_watch_settings
+
+
+class ThreatWatchHandler(FileSystemEventHandler):
+    def __init__(self, tracker, on_event=None):
+        super().__init__()
+        self.tracker = tracker
+        self.on_event = on_event
+
+    def _seen(self):
+        if self.on_event is not None:
+            self.on_event()
+
+    def on_created(self, event):
+        if event.is_directory:
+            return
+
+        file_path = event.src_path
+        print(f"[Watchdog] New file detected: {file_path}")
+        self._seen()
+
+        # scanned once the tracker sees it closed, renamed into place or quiet
+        self.tracker.touch(file_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.tracker.touch(event.src_path, create=False)
+
+    def on_closed(self, event):
+        if not event.is_directory:
+            self.tracker.closed(event.src_path)
+
+    def on_moved(self, event):
+        if event.is_directory:
+            return
+        if not self.tracker.ignored(event.dest_path):
+            print(f"[Watchdog] File moved into place: {event.dest_path}")
+            self._seen()
+        self.tracker.moved(event.src_path, event.dest_path)
+
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self.tracker.cancel(event.src_path)
+
+
+class WatcherService:
+    def __init__(self, default_folders=(), status_file=WATCHER_STATUS_FILE,
+                 interval=WATCHER_STATUS_INTERVAL, baseline=BASELINE_SCAN):
+        """default_folders are watched while settings.json lists none."""
+        self.default_folders = list(default_folders)
+        self.status_file = status_file
+        self.interval = interval
+        self.baseline = baseline
+        self.pipeline = ScanPipeline()
+        self.tracker = ReadinessTracker(self.pipeline.submit)
+        self.observer = Observer()
+        self.handler = ThreatWatchHandler(self.tracker, self._count_event)
+        self._watches = {}            # folder -> ObservedWatch
+        self._recursive = False
+        self._settings_mtime = None
+        self._baselines = []
+        self._lock = threading.Lock()
+        self._events = 0
+        self._rate = 0.0
+        self._rate_mark = (time.monotonic(), 0)
+        self._stop = threading.Event()
+        self._thread = None
+        self.started_at = None
+
+    def _count_event(self):
+        with self._lock:
+            self._events += 1
+
+    def start(self):
+        local_db.init_db()
+        history_db.init_db()
+        file_cache.init_db()
+
+        self.started_at = time.time()
+        self.pipeline.start()
+        self.tracker.start()
+        self.observer.start()
+        self.reload()
+        self._thread = threading.Thread(target=self._run, name="watcher-service", daemon=True)
+        self._thread.start()
+        return self
+
+    # -----------------------
+    # Watches
+    # -----------------------
+    def reload(self):
+        """Bring the scheduled watches in line with settings.json."""
+        try:
+            self._settings_mtime = os.path.getmtime(SETTINGS_FILE)
+        except OSError:
+            self._settings_mtime = None
+        try:
+            settings = load_watch_settings()
+        except (OSError, ValueError) as e:
+            print(f"[Watchdog] Could not read {SETTINGS_FILE}, keeping current folders: {e}")
+            return
+
+        wanted = list(dict.fromkeys(settings["folders"] or self.default_folders))
+        recursive = settings["recursive"]
+
+        with self._lock:
+            if recursive != self._recursive:
+                # the flag is per watch, so every folder is rescheduled
+                for folder in list(self._watches):
+                    self._unschedule(folder)
+                self._recursive = recursive
+
+            for folder in list(self._watches):
+                if folder not in wanted:
+                    self._unschedule(folder)
+                    print(f"[Watchdog] Stopped monitoring: {folder}")
+
+            added = []
+            for folder in wanted:
+                if folder not in self._watches and self._schedule(folder):
+                    added.append(folder)
+
+        if added and self.baseline:
+            # files that were already there before the watch started
+            self._baselines = [b for b in self._baselines if b.stats()["running"]]
+            self._baselines.append(start_baseline(added, recursive))
+
+    def _schedule(self, folder):
+        try:
+            os.makedirs(folder, exist_ok=True)
+            self._watches[folder] = self.observer.schedule(self.handler, folder, recursive=self._recursive)
+        except OSError as e:
+            print(f"[Watchdog] Cannot watch {folder}: {e}")
+            return False
+        print(f"[Watchdog] Monitoring: {folder}{' (recursive)' if self._recursive else ''}")
+        return True
+
+    def _unschedule(self, folder):
+        watch = self._watches.pop(folder)
+        try:
+            self.observer.unschedule(watch)
+        except KeyError:
+            pass
+
+    # -----------------------
+    # Settings polling and status
+    # -----------------------
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                mtime = os.path.getmtime(SETTINGS_FILE)
+            except OSError:
+                mtime = None
+            if mtime != self._settings_mtime:
+                print("[Watchdog] settings.json changed, reloading folders")
+                self.reload()
+            try:
+                self.write_status()
+            except OSError as e:
+                print(f"[Watchdog] Could not write status: {e}")
+
+    def status(self):
+        now = time.monotonic()
+        with self._lock:
+            mark_time, mark_events = self._rate_mark
+            if now - mark_time >= self.interval:
+                self._rate = (self._events - mark_events) / (now - mark_time)
+                self._rate_mark = (now, self._events)
+            watched = sorted(self._watches)
+            events = self._events
+            rate = self._rate
+            recursive = self._recursive
+        baselines = [b.stats() for b in self._baselines]
+        return {
+            "running": not self._stop.is_set(),
+            "pid": os.getpid(),
+            "started_at": self.started_at,
+            "updated_at": time.time(),
+            "watched": watched,
+            "recursive": recursive,
+            "events_total": events,
+            "events_per_sec": round(rate, 2),
+            "pending_ready": self.tracker.pending(),
+            "readiness": dict(self.tracker.stats),
+            "pipeline": self.pipeline.stats(),
+            "lookups": dict(get_coalescer().stats),
+            "baseline": baselines[-1] if baselines else None,
+        }
+
+    def write_status(self):
+        tmp = self.status_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.status(), f)
+        os.replace(tmp, self.status_file)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        for b in self._baselines:
+            b.stop()
+        self.observer.stop()
+        self.observer.join()
+        self.tracker.stop()
+        print("[Watchdog] Draining scan queue...")
+        self.pipeline.stop(drain=True)
+        wait_for_verdicts()
+        shutdown_hash_pool()
+        try:
+            self.write_status()
+        except OSError:
+            pass
+
+
+def read_status(status_file=WATCHER_STATUS_FILE, interval=WATCHER_STATUS_INTERVAL):
+    """Last status written by a running watcher service, or {"running": False}."""
+    try:
+        with open(status_file, "r") as f:
+            status = json.load(f)
+    except (OSError, ValueError):
+        return {"running": False, "watched": []}
+    if time.time() - status.get("updated_at", 0) > 3 * interval:
+        # the process went away without cleaning up
+        status["running"] = False
+    return status
+
+
+def main(default_folders=()):
+    service = WatcherService(default_folders).start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("[Watchdog] Stopping...")
+        service.stop()
+
+
+if __name__ == "__main__":
+    main()